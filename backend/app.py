@@ -1,39 +1,173 @@
-from flask import Flask, Response, jsonify, request
-from pymongo import MongoClient
+from flask import Flask, Response, jsonify, request, stream_with_context
 import os
 from dotenv import load_dotenv
-import asyncio
-from web_scrape.scrape_optimized import main  # Ensure this imports your async main function
+import functools
+import hashlib
+import pymongo
+from web_scrape.jobs import JobExists, JobQueueFull, active_jobs, submit_search
+from web_scrape.openai_pool import governor
+from web_scrape.scrape_optimized import normalize_query
+from web_scrape.llm_cache import SQLiteCache, get_llm_cache
+from web_scrape.mongo_utils import (
+    DISPLAY_PAGE_SIZE, backfill_display_fields, ensure_indexes, find_display_page, find_session_articles,
+    find_session_display_page, get_client, get_db, get_search_session, new_search_id, save_uploaded_paper,
+)
 from llm_playground import rag_function as rf
 from llm_playground import code_generation as cg
-from langchain_openai import ChatOpenAI
+from llm_playground import neo4j_pool, resources
 import threading
 import time
 import json
-from flask_caching import Cache
-from threading import Thread
+import re
 
 load_dotenv()
 
 app = Flask(__name__)
-cache = Cache(config={'CACHE_TYPE': 'simple'})
-cache.init_app(app)
-llm = ChatOpenAI(temperature=0, model_name="gpt-4o-mini-2024-07-18")
 
-# Connect to MongoDB
+# Neo4j and the LLM clients are created on first use; opt in to building them at boot instead
+if os.getenv("WARM_UP_RESOURCES"):
+    threading.Thread(target=resources.warm_up, daemon=True).start()
+
+# Connect to MongoDB through the pooled client the scraper uses as well; creating it does no I/O
 mongo_uri = os.getenv("MONGO_URI")
-client = MongoClient(mongo_uri)
-db = client['research_articles']
+client = get_client()
+db = get_db()
 summarized_collection = db['summarized_fields_article']
-raw_collection = db['raw_fields_article']
+# Seconds between attempts to prepare MongoDB while it is unreachable
+MONGO_SETUP_RETRY_SECONDS = 30
+
+
+def prepare_mongodb():
+    ensure_indexes()
+    backfill_display_fields()
+    return db
+
+
+def prepare_mongodb_in_background():
+    """Create the indexes and backfill display fields off the boot path, retrying until MongoDB answers."""
+    while True:
+        try:
+            resources.get("mongodb_setup")
+            return
+        except Exception as e:
+            print(f"Could not prepare MongoDB indexes and display fields: {e}")
+            time.sleep(MONGO_SETUP_RETRY_SECONDS)
+
+
+resources.register("mongodb_setup", prepare_mongodb)
+threading.Thread(target=prepare_mongodb_in_background, daemon=True).start()
+
+# Search IDs are uuid4 hex strings; clients may pick their own so they can watch the session while it runs
+SEARCH_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs
+    the computation and every caller that arrives while it is in flight
+    waits for and shares its result (or its exception) instead of
+    repeating the work. Nothing is kept once the call has finished.
+
+    `do(key, fn, hold=True)` keeps the call in flight after `fn` returns
+    until `release(key)`, for computations that hand back a handle (a
+    search job ID) and finish later.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "coalesced": 0, "in_flight": 0}
+
+    def do(self, key, fn, *args, hold=False, **kwargs):
+        """Return (result of `fn`, whether this call joined one already in flight)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+                self.stats["calls"] += 1
+                self.stats["in_flight"] = len(self._calls)
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
 
-gap_individual_articles_collection = db['gap_individual_articles']
-gap_comparison_section_collection = db['gap_comparison_section']
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            hold = False
+            raise
+        finally:
+            if not hold:
+                self.release(key)
+            call.done.set()
+        return call.result, False
+
+    def release(self, key):
+        with self._lock:
+            self._calls.pop(key, None)
+            self.stats["in_flight"] = len(self._calls)
+
+
+search_flights = SingleFlight("web_search")
+response_flights = SingleFlight("get_response")
+
+# JSON responses of the LLM endpoints, in a SQLite file every worker process on the host shares
+RESPONSE_CACHE_PATH = os.getenv(
+    "RESPONSE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".response_cache.sqlite3")
+)
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 ** 2))
+# Answers depend on the knowledge graph, which grows with every search, so they expire sooner than code
+GET_RESPONSE_CACHE_TTL = float(os.getenv("GET_RESPONSE_CACHE_TTL", 600))
+GENERATE_CODE_CACHE_TTL = float(os.getenv("GENERATE_CODE_CACHE_TTL", 3600))
+response_cache = SQLiteCache(RESPONSE_CACHE_PATH, max_bytes=RESPONSE_CACHE_MAX_BYTES)
+
+
+def response_cache_key(endpoint, body):
+    canonical = json.dumps({"endpoint": endpoint, "body": body}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def cached_json_response(ttl):
+    """
+    Cache a POST view's successful JSON response for `ttl` seconds, keyed
+    on the endpoint and a canonical hash of the request body, so identical
+    requests are answered from the shared cache by whichever worker gets them.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = response_cache_key(request.endpoint, request.get_json(silent=True))
+            cached = response_cache.get(request.endpoint, key)
+            if cached is not None:
+                response = app.response_class(cached, mimetype="application/json")
+                response.headers["X-Cache"] = "HIT"
+                return response
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response_cache.set(request.endpoint, key, response.get_data(as_text=True), ttl=ttl)
+            response.headers["X-Cache"] = "MISS"
+            return response
+        return wrapper
+    return decorator
 
 @app.route('/articles-summarized', methods=['GET'])
 def get_articles_summarized():
+    search_id = request.args.get('search_id')
     try:
-        articles = list(summarized_collection.find())
+        # One search session's articles, or the whole corpus
+        articles = find_session_articles(search_id) if search_id else list(summarized_collection.find())
         for article in articles:
             article['_id'] = str(article['_id'])  # Convert ObjectId to string
         return jsonify(articles), 200
@@ -42,16 +176,18 @@ def get_articles_summarized():
         return jsonify({"error": "Failed to fetch summarized articles"}), 500
 
 @app.route('/api/get_response', methods=['POST'])
+@cached_json_response(GET_RESPONSE_CACHE_TTL)
 def get_response():
     data = request.json
     user_input = data.get("user_input")
     
-    response = rf.llm_output(user_input) 
+    # Identical questions asked at the same time share one retrieval and generation
+    response, _ = response_flights.do(normalize_query(user_input), rf.llm_output, user_input)
     
     return jsonify({"response": response})
 
 @app.route('/api/generate_code', methods=['POST'])
-@cache.cached(timeout=120, query_string=True)
+@cached_json_response(GENERATE_CODE_CACHE_TTL)
 def produce_code():
     data = request.json
     user_input = data.get("user_input")
@@ -60,37 +196,223 @@ def produce_code():
     
     return jsonify({"response": response})
 
+def sse_response(tokens, cache_endpoint, body, ttl):
+    """
+    Forward `tokens` as server-sent events: one `data: {"token": ...}`
+    event per chunk, then `event: done`, or `event: error` if generation
+    fails. The response is served from, and once complete stored in, the
+    cache entry of the non-streaming `cache_endpoint`, so both variants
+    share results.
+    """
+    key = response_cache_key(cache_endpoint, body)
+    cached = response_cache.get(cache_endpoint, key)
+
+    def events():
+        if cached is not None:
+            yield f"data: {json.dumps({'token': json.loads(cached)['response']})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+            return
+        chunks = []
+        try:
+            for token in tokens():
+                chunks.append(token)
+                yield f"data: {json.dumps({'token': token})}\n\n"
+        except Exception as e:
+            print(f"Streaming {cache_endpoint} failed: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            return
+        response_cache.set(cache_endpoint, key, json.dumps({"response": "".join(chunks)}), ttl=ttl)
+        yield "event: done\ndata: {}\n\n"
+
+    # Proxies must pass each event on as it is written instead of buffering the response
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Cache": "HIT" if cached is not None else "MISS"}
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers=headers)
+
+@app.route('/api/get_response/stream', methods=['POST'])
+def stream_response():
+    data = request.json
+    user_input = data.get("user_input")
+    return sse_response(lambda: rf.llm_output_stream(user_input), 'get_response', data, GET_RESPONSE_CACHE_TTL)
+
+@app.route('/api/generate_code/stream', methods=['POST'])
+def stream_code():
+    data = request.json
+    user_input = data.get("user_input")
+    return sse_response(lambda: cg.code_generation_stream(user_input), 'produce_code', data, GENERATE_CODE_CACHE_TTL)
+
+def build_knowledge_graph(search_id):
+    """Job callback: add the articles a finished search selected to the knowledge graph."""
+    session = get_search_session(search_id) or {}
+    if session.get("status") != "done":
+        return
+    threading.Thread(
+        target=rf.create_knowledge_graph,
+        args=(client, mongo_uri, 'research_articles', 'raw_fields_article', resources.get("chat_llm")),
+        kwargs={"pmc_ids": session.get("pmc_ids", [])},
+    ).start()
+
 @app.route('/web_search', methods=['POST'])
 def search_articles():
     user_input = request.json.get('query')
     if not user_input:
         return jsonify({"error": "No query provided"}), 400
+    search_id = request.json.get('search_id') or new_search_id()
+    if not SEARCH_ID_PATTERN.match(search_id):
+        return jsonify({"error": "Invalid search_id"}), 400
+    
+    print(f"Received query: {user_input} (search {search_id})")
+
+    # The search runs on the job pool; clients poll /jobs/<id> instead of holding the request open.
+    # A query that is already being searched joins that job and gets its ID back.
+    key = normalize_query(user_input)
+
+    def on_done(finished_id):
+        search_flights.release(key)
+        build_knowledge_graph(finished_id)
+
     try:
-        summarized_collection.delete_many({})
-        raw_collection.delete_many({})
-        gap_individual_articles_collection.delete_many({})
-        gap_comparison_section_collection.delete_many({})
+        search_id, coalesced = search_flights.do(
+            key, submit_search, user_input, search_id, on_done=on_done, hold=True
+        )
+    except JobExists as e:
+        # Search IDs name one search; pick a new one (or leave it out) to search again
+        return jsonify({"error": str(e), "search_id": search_id, "status_url": f"/jobs/{search_id}"}), 409
+    except JobQueueFull as e:
+        return jsonify({"error": f"Too many searches in progress, try again shortly ({e})"}), 503
+    except pymongo.errors.PyMongoError as e:
+        # The search session could not be recorded, so no job was started
+        print(f"Could not start search {search_id}: {e}")
+        return jsonify({"error": "The search database is unavailable, try again shortly"}), 503
+    return jsonify({
+        "message": "Joined the search already in progress." if coalesced else "Search started.",
+        "job_id": search_id,
+        "search_id": search_id,
+        "status_url": f"/jobs/{search_id}",
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    session = get_search_session(job_id)
+    if not session:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify({
+        "job_id": job_id,
+        "query": session.get("query"),
+        "status": session.get("status"),
+        "stage": session.get("stage"),
+        "progress": session.get("progress", {}),
+        "articles": len(session.get("pmc_ids", [])),
+        "error": session.get("error"),
+        "created_at": session.get("created_at"),
+        "updated_at": session.get("updated_at"),
+    }), 200
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    session = get_search_session(job_id)
+    if not session:
+        return jsonify({"error": "Unknown job"}), 404
+    if session.get("status") != "done":
+        return jsonify({"error": "Job has not finished", "status": session.get("status")}), 409
+    articles = find_session_articles(job_id)
+    for article in articles:
+        article.pop('_id', None)
+    return jsonify({
+        "job_id": job_id,
+        "query": session.get("query"),
+        "articles": articles,
+        "gaps": list(db['gap_individual_articles'].find({"search_id": job_id}, {"_id": 0})),
+        "comparison": db['gap_comparison_section'].find_one({"search_id": job_id}, {"_id": 0}),
+    }), 200
+
+def page_arg():
+    # Table pages are numbered from 0
+    return max(request.args.get('page', 0, type=int), 0)
+
+@app.route('/jobs/<job_id>/articles', methods=['GET'])
+def job_articles(job_id):
+    """One page of the job's table rows; readable while the search is still running."""
+    try:
+        rows, total = find_session_display_page(job_id, page_arg())
     except Exception as e:
-        print(f"Error clearing collections: {e}")
-        return jsonify({"error": "Failed to clear collections", "details": str(e)}), 500
-    
-    print(f"Received query: {user_input}")
+        print(f"Error fetching articles of job {job_id}: {e}")
+        return jsonify({"error": "Failed to fetch articles"}), 500
+    return jsonify({"articles": rows, "total": total, "page_size": DISPLAY_PAGE_SIZE}), 200
 
-    # # Define a function to wrap the asyncio.run() call in a thread
-    # def run_async_main():
-    #     asyncio.run(main(user_input))
+@app.route('/jobs/<job_id>/gaps', methods=['GET'])
+def job_gaps(job_id):
+    try:
+        return jsonify({
+            "gaps": list(db['gap_individual_articles'].find({"search_id": job_id}, {"_id": 0})),
+            "comparison": list(db['gap_comparison_section'].find({"search_id": job_id}, {"_id": 0})),
+        }), 200
+    except Exception as e:
+        print(f"Error fetching gaps of job {job_id}: {e}")
+        return jsonify({"error": "Failed to fetch gaps"}), 500
+
+@app.route('/papers', methods=['GET'])
+def list_papers():
+    """One page of the uploaded papers' table rows, newest first."""
+    try:
+        rows, total = find_display_page("pdf_upload_papers", page=page_arg())
+    except Exception as e:
+        print(f"Error fetching uploaded papers: {e}")
+        return jsonify({"error": "Failed to fetch papers"}), 500
+    return jsonify({"papers": rows, "total": total, "page_size": DISPLAY_PAGE_SIZE}), 200
+
+@app.route('/papers', methods=['POST'])
+def upload_paper():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected the paper as a JSON object"}), 400
+    try:
+        paper_id = save_uploaded_paper(data)
+    except Exception as e:
+        print(f"Error saving uploaded paper: {e}")
+        return jsonify({"error": "Failed to save paper"}), 500
+    return jsonify({"id": str(paper_id)}), 201
+
+# Relationships drawn by the Knowledge Graph page
+KNOWLEDGE_GRAPH_LIMIT = int(os.getenv("KNOWLEDGE_GRAPH_LIMIT", 500))
 
-    # # Start the thread to run the async function
-    # thread = Thread(target=run_async_main)
-    # thread.start()
-    # thread.join()
+@app.route('/knowledge_graph', methods=['GET'])
+def knowledge_graph():
+    try:
+        graph_data = rf.fetchGraphData(KNOWLEDGE_GRAPH_LIMIT)
+    except Exception as e:
+        print(f"Error fetching the knowledge graph: {e}")
+        return jsonify({"error": "Failed to fetch the knowledge graph"}), 503
+    return jsonify(graph_data), 200
 
-    # return jsonify({"message": "Search completed successfully."}), 200
+HEALTHZ_TIMEOUT_SECONDS = 2
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Readiness per dependency; resources nobody has used yet report not_started."""
+    dependencies = resources.health()
+    try:
+        # A health check must answer quickly even when MongoDB does not
+        with pymongo.timeout(HEALTHZ_TIMEOUT_SECONDS):
+            client.admin.command("ping")
+        dependencies["mongodb"] = {"status": "ready"}
+    except Exception as e:
+        dependencies["mongodb"] = {"status": "failed", "error": repr(e)}
+    healthy = all(dependency["status"] != "failed" for dependency in dependencies.values())
+    return jsonify({"status": "ok" if healthy else "degraded", "dependencies": dependencies}), 200 if healthy else 503
 
-    # Run the async main function using asyncio.run()
-    asyncio.run(main(user_input))
-    threading.Thread(target=rf.create_knowledge_graph, args=(client, mongo_uri, 'research_articles', 'raw_fields_article', llm)).start()
-    return jsonify({"message": "Search completed successfully."}), 200
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        "coalescing": {flights.name: dict(flights.stats) for flights in (search_flights, response_flights)},
+        "active_jobs": active_jobs(),
+        "response_cache": response_cache.stats(),
+        # Queue depth and wait time in front of the OpenAI rate limits
+        "openai_governor": governor.stats(),
+        # Hit rate per summarization caller
+        "llm_cache": get_llm_cache().stats(),
+        # Only reported once the graph has been built; /stats never opens the driver
+        "neo4j_pool": neo4j_pool.pool_metrics(resources.peek("graph")),
+    }), 200
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -3,6 +3,7 @@ import os
 from dotenv import load_dotenv
 import pdfplumber
 import anthropic
+from web_scrape.llm_cache import get_llm_cache
 
 load_dotenv()
 client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
@@ -28,10 +29,10 @@ def extract_text_from_pdf(filename):
     return full_paper
 
 
-def generate_code_from_description(description):
+def code_request(description):
     prompt = f"Generate Python code for the following methodology, look through all the steps taken and generate code that precisely mimics them.:\n\n{description}"
     
-    message = client.messages.create(
+    request = dict(
     model="claude-3-5-sonnet-20240620",
     max_tokens=800,
     temperature=0,
@@ -48,6 +49,20 @@ def generate_code_from_description(description):
             }
         ]
     )
+    return request
+
+
+def generate_code_from_description(description):
+    request = code_request(description)
+
+    # The same PDF text is often submitted again; serve it from the shared completion cache
+    llm_cache = get_llm_cache()
+    cached = llm_cache.lookup("generate_code_from_description", **request)
+    if cached is not None:
+        return cached
+
+    message = client.messages.create(**request)
+    llm_cache.store("generate_code_from_description", message.content[0].text, **request)
     return(message.content[0].text)
 
     # response = client.chat.completions.create(
@@ -70,8 +85,28 @@ def generate_code_from_description(description):
 
     # return response.choices[0].message.content
 
+def generate_code_from_description_stream(description):
+    """Yield the generated code as Claude writes it; a cached result comes back in one piece."""
+    request = code_request(description)
+    llm_cache = get_llm_cache()
+    cached = llm_cache.lookup("generate_code_from_description", **request)
+    if cached is not None:
+        yield cached
+        return
+
+    chunks = []
+    with client.messages.stream(**request) as stream:
+        for text in stream.text_stream:
+            chunks.append(text)
+            yield text
+    # Only a completed stream is cached; an abandoned one leaves nothing behind
+    llm_cache.store("generate_code_from_description", "".join(chunks), **request)
+
 def code_generation(text):
     # full_paper = extract_text_from_pdf(filename=filename)
     response = generate_code_from_description(text)
 
-    return response
\ No newline at end of file
+    return response
+
+def code_generation_stream(text):
+    yield from generate_code_from_description_stream(text)
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""
+Connection pool settings for the process's Neo4j driver.
+
+The driver keeps a pool of Bolt connections, so it lives as long as the
+process instead of paying a TCP+TLS+Bolt handshake per query. The only
+driver is the one LangChain's Neo4jGraph builds for the `graph` resource;
+the vector index and the Knowledge Graph endpoint query through it too.
+It gets these settings through `driver_config()`, and `/stats` reports
+its pool with `pool_metrics()`.
+"""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", 50))
+# Seconds to wait for a free pooled connection before giving up
+NEO4J_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", 30))
+# Connections are recycled after this many seconds so load balancers do not cut them mid-query
+NEO4J_MAX_CONNECTION_LIFETIME = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", 3600))
+
+
+def driver_config():
+    """Pool settings passed to the driver LangChain's Neo4jGraph creates."""
+    return {
+        "max_connection_pool_size": NEO4J_MAX_POOL_SIZE,
+        "connection_acquisition_timeout": NEO4J_ACQUISITION_TIMEOUT,
+        "max_connection_lifetime": NEO4J_MAX_CONNECTION_LIFETIME,
+    }
+
+
+def pool_metrics(graph=None):
+    """Pool size and, per server address, pooled and in-use connections of `graph`'s driver."""
+    metrics = {"max_pool_size": NEO4J_MAX_POOL_SIZE, "driver_open": graph is not None}
+    # Neither Neo4jGraph nor the driver has a public pool API; per-address counts are best
+    # effort and simply left out when their internals do not look as expected
+    try:
+        pool = graph._driver._pool
+        with pool.lock:
+            metrics["addresses"] = {
+                str(address): {
+                    "connections": len(pooled),
+                    "in_use": sum(1 for connection in pooled if connection.in_use),
+                }
+                for address, pooled in pool.connections.items()
+            }
+    except Exception:
+        pass
+    return metrics
@@ -1,6 +1,5 @@
 from pymongo import MongoClient
 import os
-import json
 from langchain_core.runnables import (
     RunnableBranch,
     RunnableLambda,
@@ -13,13 +12,8 @@ from pydantic import BaseModel, Field
 from typing import Tuple, List, Optional
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.output_parsers import StrOutputParser
-from langchain_community.graphs import Neo4jGraph
 from langchain.text_splitter import TokenTextSplitter
-from langchain_openai import ChatOpenAI
 from langchain_experimental.graph_transformers import LLMGraphTransformer
-from neo4j import GraphDatabase
-from langchain_community.vectorstores import Neo4jVector
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores.neo4j_vector import remove_lucene_chars
 from langchain_core.runnables import ConfigurableField, RunnableParallel, RunnablePassthrough
 from langchain.schema import Document
@@ -28,6 +22,8 @@ from langchain.schema import Document
 from langchain_experimental.graph_transformers import LLMGraphTransformer
 from dotenv import load_dotenv
 import time
+from web_scrape.full_text_store import iter_articles_with_full_text
+from llm_playground import resources
 
 # Uncomment the following line to enable debugging
 # from neo4j.debug import watch
@@ -96,7 +92,7 @@ class Entities(BaseModel):
     #     ..., description="References to other research papers cited in the documents."
     # )
 
-def create_knowledge_graph(client, mongo_uri: str, db_name: str, collection_name: str, llm, batch_size: int = 10, max_workers: int = 13):
+def create_knowledge_graph(client, mongo_uri: str, db_name: str, collection_name: str, llm, batch_size: int = 10, max_workers: int = 13, pmc_ids=None):
     print("Knowledge graph creation started")
     start_time = time.time()
     # Connect to MongoDB
@@ -104,10 +100,11 @@ def create_knowledge_graph(client, mongo_uri: str, db_name: str, collection_name
     db = client[db_name]
     collection = db[collection_name]
 
-    graph = Neo4jGraph()  
+    graph = resources.get("graph")
 
-    # Pull articles from MongoDB
-    papers = collection.find()
+    # Pull articles from MongoDB (only those of one search when pmc_ids is given),
+    # with their sections loaded from the compressed full-text store in batches
+    papers = iter_articles_with_full_text(collection, {"pmc_id": {"$in": list(pmc_ids)}} if pmc_ids is not None else {})
     documents = []
 
     # Process each paper into a Document for the graph
@@ -155,50 +152,33 @@ def create_knowledge_graph(client, mongo_uri: str, db_name: str, collection_name
     
     return graph
 
-def fetchGraphData(cypher: str = "MATCH (s)-[r:!MENTIONS]->(t) RETURN s,r,t LIMIT 50"):
-    # create a neo4j session to run queries
-    driver = GraphDatabase.driver(
-        uri=os.environ["NEO4J_URI"],
-        auth=(os.environ["NEO4J_USERNAME"], os.environ["NEO4J_PASSWORD"])
+def fetchGraphData(limit: int = 50):
+    """Nodes and links of up to `limit` relationships (other than MENTIONS), as drawn by the Knowledge Graph page."""
+    # Queried over the graph resource's driver, the one pool of Neo4j connections in the process
+    records = resources.get("graph").query(
+        """MATCH (s)-[r:!MENTIONS]->(t)
+        RETURN elementId(s) AS source_key, s.id AS source, s.labels AS source_labels, type(r) AS type,
+               elementId(t) AS target_key, t.id AS target, t.labels AS target_labels
+        LIMIT $limit""",
+        {"limit": limit},
     )
-    session = driver.session()
-
-    # Run the query and fetch results
-    result = session.run(cypher)
-
-    # Convert results to a format suitable for JSON
-    graph_data = []
-    for record in result:
-        source = record['s']
-        relationship = record['r']
-        target = record['t']
-        
-        graph_data.append({
-            'source': dict(source),  # Convert Node to dict
-            'relationship': {
-                'type': relationship.type,  # Extract relationship type
-                'properties': dict(relationship)  # Convert Relationship properties to dict
-            },
-            'target': dict(target)  # Convert Node to dict
+    nodes = {}
+    links = []
+    for record in records:
+        for end in ("source", "target"):
+            if record[f"{end}_key"] not in nodes:
+                nodes[record[f"{end}_key"]] = {
+                    'id': record[end],
+                    'label': record[end],
+                    'description': record[f"{end}_labels"],
+                }
+        links.append({
+            'source': record['source'],
+            'target': record['target'],
+            'type': record['type'],
         })
 
-    session.close()
-    return graph_data
-
-graph = Neo4jGraph()
-
-vector_index = Neo4jVector.from_existing_graph(
-    OpenAIEmbeddings(),
-    search_type="hybrid",
-    node_label="Document",
-    text_node_properties=["text"],
-    embedding_node_property="embedding"
-)
-
-def saveGraphDataToJSON(graph_data, filename='graph_data.json'):
-    # Save the graph data to a JSON file
-    with open(filename, 'w') as json_file:
-        json.dump(graph_data, json_file, indent=4)
+    return {'nodes': list(nodes.values()), 'links': links}
 
 def generate_full_text_query(input: str) -> str:
     full_text_query = ""
@@ -273,14 +253,10 @@ def llm_generation(question: str, llm, graph, vector_index) -> str:
 
 
 def run_full_workflow(mongo_uri: str, db_name: str, collection_name: str, llm, question: str, json_filename: str = 'graph_data.json') -> str:    
-    # Step 1: Fetch Graph Data
-    graph_data= fetchGraphData()
-    
-    # Step 2: Save Graph Data to JSON
-    # saveGraphDataToJSON(graph_data, json_filename)
-    
-    # Step 3: LLM Generation and Retrieval
-    final_response = llm_generation(question, llm, graph, vector_index)
+    # The graph dump (fetchGraphData, served by /knowledge_graph) is not needed to answer,
+    # so a question only pays for retrieval and generation
+    # LLM Generation and Retrieval
+    final_response = llm_generation(question, llm, resources.get("graph"), resources.get("vector_index"))
     
     return final_response
 
@@ -290,10 +266,11 @@ def run_full_workflow(mongo_uri: str, db_name: str, collection_name: str, llm, q
 mongo_uri = os.getenv("MONGO_URI")
 db_name = os.getenv("MONGO_DB_NAME")
 collection_name = 'gut_microbiome'
-llm = ChatOpenAI(temperature=0, model_name="gpt-4o-mini-2024-07-18")
 
 
-def llm_output(question):
+def answer_chain(question):
+    """Retrieve the graph and vector context for `question` and return the chain that answers from it."""
+    llm = resources.get("chat_llm")
     final_context = run_full_workflow(mongo_uri, db_name, collection_name, llm, question)
     _template = """Given the following conversation and a follow up question, rephrase the follow up question to be a standalone question,
                 in its original language.
@@ -320,7 +297,7 @@ def llm_output(question):
                 chat_history=lambda x: _format_chat_history(x["chat_history"])
             )
             | CONDENSE_QUESTION_PROMPT
-            | ChatOpenAI(temperature=0)
+            | resources.get("condense_llm")
             | StrOutputParser(),
         ),
         # Else, we have no chat history, so just pass through the question
@@ -350,7 +327,16 @@ def llm_output(question):
         | StrOutputParser()
     )
 
-    return chain.invoke({"question": question})
+    return chain
+
+
+def llm_output(question):
+    return answer_chain(question).invoke({"question": question})
+
+
+def llm_output_stream(question):
+    """Yield the answer's tokens as the LLM produces them; retrieval still completes first."""
+    yield from answer_chain(question).stream({"question": question})
 
 # print("-----------------------------")
 # print(llm_output("What is good about MicrobiotaCN?"))
\ No newline at end of file
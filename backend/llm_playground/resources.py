@@ -0,0 +1,112 @@
+"""
+Lazily created clients shared across the API process.
+
+The Neo4j graph, its vector index and the chat models used to be built
+when `rag_function` was imported, so every worker boot made network round
+trips (and could embed every un-embedded Document node) and failed
+outright when Neo4j was down. Here each one is created on first use,
+once per process, and its readiness is recorded for `/healthz`.
+
+    from llm_playground import resources
+    graph = resources.get("graph")
+
+Call `warm_up()` (or set WARM_UP_RESOURCES=1 for the API) to create them
+ahead of the first request instead.
+"""
+import threading
+import time
+
+from langchain_community.graphs import Neo4jGraph
+from langchain_community.vectorstores import Neo4jVector
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from llm_playground.neo4j_pool import driver_config
+
+CHAT_MODEL = "gpt-4o-mini-2024-07-18"
+
+
+class Resource:
+    """One lazily built client; a failed build is recorded and retried on the next `get`."""
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self._value = None
+        self._ready = False
+        self._lock = threading.Lock()
+        self.error = None
+        self.build_seconds = None
+
+    def get(self):
+        if self._ready:
+            return self._value
+        with self._lock:
+            if not self._ready:
+                start = time.time()
+                try:
+                    self._value = self.factory()
+                except Exception as e:
+                    self.error = repr(e)
+                    raise
+                self.build_seconds = time.time() - start
+                self.error = None
+                self._ready = True
+        return self._value
+
+    def status(self):
+        if self._ready:
+            return {"status": "ready", "build_seconds": round(self.build_seconds, 3)}
+        if self.error is not None:
+            return {"status": "failed", "error": self.error}
+        return {"status": "not_started"}
+
+
+_resources = {}
+
+
+def register(name, factory):
+    _resources[name] = Resource(name, factory)
+
+
+def get(name):
+    return _resources[name].get()
+
+
+def peek(name):
+    """The resource if it has been created, else None; never creates it."""
+    resource = _resources[name]
+    return resource.get() if resource.status()["status"] == "ready" else None
+
+
+def warm_up(names=None):
+    """Create the named resources (all by default) now; returns their status, never raises."""
+    for name in names or list(_resources):
+        try:
+            get(name)
+        except Exception as e:
+            print(f"Warm-up of {name} failed: {e}")
+    return health()
+
+
+def health():
+    return {name: resource.status() for name, resource in _resources.items()}
+
+
+def _vector_index():
+    # Reuses the graph's driver; from_existing_graph embeds Document nodes that have no embedding yet
+    return Neo4jVector.from_existing_graph(
+        OpenAIEmbeddings(),
+        graph=get("graph"),
+        search_type="hybrid",
+        node_label="Document",
+        text_node_properties=["text"],
+        embedding_node_property="embedding",
+    )
+
+
+register("chat_llm", lambda: ChatOpenAI(temperature=0, model_name=CHAT_MODEL))
+# Rephrases follow-up questions into standalone ones
+register("condense_llm", lambda: ChatOpenAI(temperature=0))
+# Neo4jGraph opens the process's one Neo4j driver, with the shared pool settings
+register("graph", lambda: Neo4jGraph(driver_config=driver_config()))
+register("vector_index", _vector_index)
@@ -0,0 +1,56 @@
+"""
+Offline benchmark for the extractive pre-compression in front of the
+summarization prompts, reporting prompt tokens before and after
+compress_text and the time it takes per section.
+
+Run from `backend/`:
+
+    python -m web_scrape.bench_extractive                    # recorded fixtures
+    python -m web_scrape.bench_extractive --ratio 0.3 0.5 0.7
+
+Uses the same BioC fixtures as bench_parse_bioc (a synthetic document
+when none are recorded).
+"""
+import argparse
+import time
+
+from .bench_parse_bioc import load_fixtures
+from .extractive import EXTRACTIVE_RATIO, compress_text
+from .openai_pool import count_tokens
+from .scrape_optimized import SECTIONS_TO_SUMMARIZE, parse_bioc_xml
+
+
+def measure(sections, ratio, repeat):
+    tokens_before = tokens_after = 0
+    elapsed = 0.0
+    for content in sections.values():
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            compressed = compress_text(content, ratio)
+            best = min(best, time.perf_counter() - start)
+        elapsed += best
+        tokens_before += count_tokens(content)
+        tokens_after += count_tokens(compressed)
+    return tokens_before, tokens_after, elapsed
+
+
+def main(ratios, repeat):
+    for name, xml_bytes in load_fixtures().items():
+        parsed = parse_bioc_xml(xml_bytes)
+        sections = {section: parsed[section] for section in SECTIONS_TO_SUMMARIZE if parsed.get(section)}
+        print(f"{name} ({len(sections)} sections)")
+        for ratio in ratios:
+            before, after, elapsed = measure(sections, ratio, repeat)
+            print(
+                f"  ratio {ratio:.2f}  {before:7d} -> {after:7d} tokens  "
+                f"({before / max(after, 1):4.2f}x fewer)  {elapsed * 1000:8.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ratio", nargs="+", type=float, default=[EXTRACTIVE_RATIO])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.ratio, args.repeat)
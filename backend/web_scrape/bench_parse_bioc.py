@@ -0,0 +1,127 @@
+"""
+Micro-benchmark for parse_bioc_xml against the previous ElementTree
+implementation, reporting time per document and peak traced memory.
+
+Run from `backend/`:
+
+    python -m web_scrape.bench_parse_bioc                      # recorded fixtures
+    python -m web_scrape.bench_parse_bioc --record PMC7614744  # record a fixture first
+
+Fixtures are BioC XML files in `web_scrape/fixtures/bioc/`. When there are
+none, a synthetic document with the same structure is generated instead.
+"""
+import argparse
+import asyncio
+import glob
+import os
+import random
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from .scrape_optimized import NCBI_API_KEY, clean_parsed_sections, fetch_full_text, parse_bioc_xml
+from .ncbi_client import NCBIClient
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "bioc")
+
+
+def legacy_parse_bioc_xml(xml_text):
+    # parse_bioc_xml as it was before the iterparse rewrite
+    root = ET.fromstring(xml_text)
+    sections = {"abstract": "", "introduction": "", "methods": "", "results": "", "discussion": "", "conclusion": ""}
+    for passage in root.findall('.//passage'):
+        section_type = passage.find('./infon[@key="section_type"]')
+        passage_text = passage.find('text')
+        if section_type is not None and passage_text is not None:
+            section_type_text = section_type.text.lower()
+            passage_text_content = passage_text.text or ""
+            if "abstract" in section_type_text:
+                sections["abstract"] += clean_parsed_sections(passage_text_content)
+            elif "intro" in section_type_text:
+                sections["introduction"] += clean_parsed_sections(passage_text_content)
+            elif "method" in section_type_text:
+                sections["methods"] += clean_parsed_sections(passage_text_content)
+            elif "result" in section_type_text:
+                sections["results"] += clean_parsed_sections(passage_text_content)
+            elif "discuss" in section_type_text:
+                sections["discussion"] += clean_parsed_sections(passage_text_content)
+            elif "concl" in section_type_text:
+                sections["conclusion"] += clean_parsed_sections(passage_text_content)
+    return sections
+
+
+def make_synthetic_bioc(passages_per_section=120, words_per_passage=150, seed=0):
+    rng = random.Random(seed)
+    vocabulary = ["microbiome", "cohort", "sequencing", "analysis", "significant", "samples", "gut", "taxa",
+                  "associated", "increase", "model", "patients", "bacterial", "diversity", "we", "observed"]
+    passages = []
+    offset = 0
+    for section_type in ["ABSTRACT", "INTRO", "METHODS", "RESULTS", "DISCUSS", "CONCL", "REF"]:
+        for _ in range(passages_per_section):
+            words = [rng.choice(vocabulary) for _ in range(words_per_passage)]
+            for i in range(12, len(words), 12):
+                words[i - 1] += rng.choice([".", ",", ";"])
+            text = " ".join(words) + "."
+            passages.append(
+                f'<passage><infon key="section_type">{section_type}</infon><infon key="type">paragraph</infon>'
+                f"<offset>{offset}</offset><text>{text}</text></passage>"
+            )
+            offset += len(text)
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><collection><source>PMC</source>'
+        "<document><id>synthetic</id>" + "".join(passages) + "</document></collection>"
+    ).encode("utf-8")
+
+
+def load_fixtures(directory=FIXTURES_DIR):
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.xml"))):
+        with open(path, "rb") as f:
+            fixtures[os.path.basename(path)] = f.read()
+    if not fixtures:
+        print(f"No recorded fixtures in {directory}, using a synthetic document.")
+        fixtures["synthetic.xml"] = make_synthetic_bioc()
+    return fixtures
+
+
+async def record(pmc_ids, directory=FIXTURES_DIR):
+    os.makedirs(directory, exist_ok=True)
+    async with NCBIClient(api_key=NCBI_API_KEY) as client:
+        for pmc_id in pmc_ids:
+            body = await fetch_full_text(client, pmc_id)
+            if body is not None:
+                with open(os.path.join(directory, f"{pmc_id}.xml"), "wb") as f:
+                    f.write(body)
+                print(f"Recorded {pmc_id} ({len(body) / 1024:.0f} KiB)")
+
+
+def measure(parse, xml_bytes, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(xml_bytes)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    parse(xml_bytes)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main(repeat):
+    for name, xml_bytes in load_fixtures().items():
+        print(f"{name} ({len(xml_bytes) / 1024:.0f} KiB)")
+        for label, parse in (("legacy", legacy_parse_bioc_xml), ("iterparse", parse_bioc_xml)):
+            elapsed, peak = measure(parse, xml_bytes, repeat)
+            print(f"  {label:<10} {elapsed * 1000:8.2f} ms  peak {peak / 1024 ** 2:6.2f} MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", nargs="+", metavar="PMC_ID", help="download BioC fixtures before benchmarking")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record(args.record))
+    main(args.repeat)
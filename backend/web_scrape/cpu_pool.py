@@ -0,0 +1,55 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# A process pool parses documents in parallel on multi-core hosts; on a
+# single CPU a thread pool is enough to keep parsing off the event loop.
+SCRAPER_POOL_KIND = os.getenv("SCRAPER_POOL_KIND", "process" if (os.cpu_count() or 1) > 1 else "thread")
+SCRAPER_POOL_WORKERS = int(os.getenv("SCRAPER_POOL_WORKERS", os.cpu_count() or 1))
+
+_executor = None
+# Search jobs run on several threads and can all reach for the executor at once
+_executor_lock = threading.Lock()
+
+
+def _process_context():
+    # Forking a process that runs job, Flask and MongoDB threads can copy a lock held by one of them
+    # into the worker; forkserver (spawn where it is unavailable) starts workers from a clean process
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # Import the parsing code once in the server process rather than in every worker
+        context.set_forkserver_preload([__name__.rpartition(".")[0] + ".scrape_optimized"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def get_cpu_executor():
+    """Executor for CPU-bound scraper work (XML parsing, text cleaning), created on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if SCRAPER_POOL_KIND == "process":
+                _executor = ProcessPoolExecutor(max_workers=SCRAPER_POOL_WORKERS, mp_context=_process_context())
+            else:
+                _executor = ThreadPoolExecutor(max_workers=SCRAPER_POOL_WORKERS, thread_name_prefix="scraper-cpu")
+        return _executor
+
+
+def shutdown_cpu_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown_cpu_executor)
+
+
+async def run_cpu(func, *args):
+    """Run `func(*args)` on the CPU executor and await the result without blocking the loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_executor(), func, *args)
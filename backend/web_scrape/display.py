@@ -0,0 +1,99 @@
+"""
+Table-ready display fields, computed when documents are written so the
+Streamlit tables can read a small `display` sub-document with a projection
+instead of every full-length section.
+"""
+
+SECTION_COLUMNS = (
+    ("Introduction", "introduction"),
+    ("Methods", "methods"),
+    ("Results", "results"),
+    ("Discussion", "discussion"),
+    ("Conclusion", "conclusion"),
+)
+
+
+def truncate_text(text, max_words=50):
+    if text is None or text == "" or not isinstance(text, str):
+        return "N/A"
+    # maxsplit stops after the words we keep instead of splitting the whole section
+    words = text.split(maxsplit=max_words)
+    if len(words) > max_words:
+        return " ".join(words[:max_words]) + "..."
+    return text
+
+
+def format_list(options: list) -> str:
+    if not options or len(options) == 1:
+        return "N/A"
+    return " | ".join(str(option) for option in options)
+
+
+def format_reference(options: list) -> str:
+    if not options or len(options) == 1:
+        return "N/A"
+
+    formatted_references = []
+    index = 1
+    for option in options:
+        if isinstance(option, dict):
+            authors = option.get("authors", "N/A")
+            title = option.get("title", "N/A")
+            journal = option.get("journal_name", "N/A")
+            year = option.get("publication_date", "N/A").split()[-1]  # Extract year
+
+            reference = f"{index}. {authors} ({year}). {title}. {journal}. \n"
+            formatted_references.append(reference)
+            index += 1
+
+    return "\n".join(formatted_references)
+
+
+def pubmed_display(data):
+    """Columns of the Search page table for a summarized_fields_article document."""
+    display_data = {
+        # Preview rows come from local extractive summaries until the LLM summary replaces them
+        "Status": "Preview" if data.get("provisional") else "Summarized",
+        "Link": data.get("article_url", "N/A"),
+        "PMC ID": data.get("pmc_id", "N/A"),
+        "Title": data.get("title", "N/A"),
+        "Abstract": truncate_text(data.get("abstract", "N/A")),
+        "Authors": format_list(data.get("authors", [])),
+        "Publication Date": data.get("publication_date", "N/A"),
+        "Journal Name": data.get("journal_name", "N/A"),
+        "DOI": data.get("doi", "N/A"),
+    }
+    for column, field in SECTION_COLUMNS:
+        display_data[column] = truncate_text(data.get(field, "N/A"))
+    return display_data
+
+
+def pdf_display(data):
+    """Columns of the Table page for a pdf_upload_papers document."""
+    display_data = {
+        "Title": data.get("title", "N/A"),
+        "Abstract": truncate_text(data.get("abstract", "N/A")),
+        "Authors": format_list(data.get("authors", [])),
+        "Publication Date": data.get("publication_date", "N/A"),
+        "Journal Name": data.get("journal_name", "N/A"),
+        "DOI": data.get("doi", "N/A"),
+        "Keywords": format_list(data.get("keywords", [])),
+    }
+    for column, field in SECTION_COLUMNS:
+        display_data[column] = truncate_text(data.get(field, "N/A"))
+    display_data["References"] = truncate_text(format_reference(data.get("references", [])), max_words=100)
+    return display_data
+
+
+DISPLAY_BUILDERS = {
+    "summarized_fields_article": pubmed_display,
+    "pdf_upload_papers": pdf_display,
+}
+
+
+def with_display_fields(collection_name, document):
+    """`document` plus its `display` sub-document, for collections shown in a table."""
+    builder = DISPLAY_BUILDERS.get(collection_name)
+    if builder is None:
+        return document
+    return dict(document, display=builder(document))
@@ -0,0 +1,125 @@
+import math
+import os
+import re
+
+import numpy as np
+
+# Share of a section's characters kept by compress_text
+EXTRACTIVE_RATIO = float(os.getenv("EXTRACTIVE_RATIO", 0.5))
+# Texts with fewer sentences than this are already short enough and pass through unchanged
+EXTRACTIVE_MIN_SENTENCES = int(os.getenv("EXTRACTIVE_MIN_SENTENCES", 8))
+# Only the most widespread terms become TF-IDF features, which bounds the matrix for very long sections
+EXTRACTIVE_MAX_FEATURES = 2048
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_ITERATIONS = 50
+# Sentences per section in a preview summary
+PREVIEW_SENTENCES = int(os.getenv("PREVIEW_SENTENCES", 2))
+
+# Kept between passages in parsed sections so long sections can be split on passage boundaries
+PASSAGE_SEPARATOR = "\n\n"
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9(\[])')
+_WORD = re.compile(r'[a-z][a-z0-9-]{2,}')
+STOPWORDS = frozenset(
+    "the and for with that this from were was are have has had been which their these those than then "
+    "also into such not but can may our its they there between both each other more most all any however "
+    "using used use study studies data analysis results showed shown found based one two three within".split()
+)
+
+
+def split_sentences(text):
+    """(passage index, sentence) pairs, keeping track of passage boundaries."""
+    return [
+        (index, sentence)
+        for index, passage in enumerate(text.split(PASSAGE_SEPARATOR))
+        for sentence in _SENTENCE_END.split(passage)
+        if sentence
+    ]
+
+
+def tfidf_matrix(sentences):
+    """L2-normalised TF-IDF rows, one per sentence, over the EXTRACTIVE_MAX_FEATURES most common terms."""
+    tokens = [[word for word in _WORD.findall(sentence.lower()) if word not in STOPWORDS] for sentence in sentences]
+    document_frequency = {}
+    for words in tokens:
+        for word in set(words):
+            document_frequency[word] = document_frequency.get(word, 0) + 1
+    features = sorted(document_frequency, key=document_frequency.get, reverse=True)[:EXTRACTIVE_MAX_FEATURES]
+    vocabulary = {word: i for i, word in enumerate(features)}
+
+    rows, cols = [], []
+    for row, words in enumerate(tokens):
+        for word in words:
+            col = vocabulary.get(word)
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+    tf = np.zeros((len(sentences), len(vocabulary)), dtype=np.float32)
+    np.add.at(tf, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), 1.0)
+
+    df = np.array([document_frequency[word] for word in features], dtype=np.float32)
+    matrix = tf * (np.log((1 + len(sentences)) / (1 + df)) + 1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def textrank_scores(matrix):
+    """PageRank over the cosine-similarity graph of the sentences."""
+    n = matrix.shape[0]
+    similarity = matrix @ matrix.T
+    np.fill_diagonal(similarity, 0)
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    # Sentences with no shared terms link to every sentence equally
+    transition = np.where(out_weight > 0, similarity / np.where(out_weight == 0, 1, out_weight), 1.0 / n)
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(TEXTRANK_ITERATIONS):
+        updated = (1 - TEXTRANK_DAMPING) / n + TEXTRANK_DAMPING * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < 1e-6:
+            return updated
+        scores = updated
+    return scores
+
+
+def compress_text(text, ratio=EXTRACTIVE_RATIO):
+    """
+    Keep the highest-ranked sentences of `text` (TextRank over TF-IDF
+    sentence vectors) until `ratio` of its characters are used, in their
+    original order and passages.
+    """
+    if not text or ratio >= 1:
+        return text
+    sentences = split_sentences(text)
+    if len(sentences) < EXTRACTIVE_MIN_SENTENCES:
+        return text
+
+    scores = textrank_scores(tfidf_matrix([sentence for _, sentence in sentences]))
+    lengths = np.array([len(sentence) + 1 for _, sentence in sentences])
+    budget = math.ceil(lengths.sum() * ratio)
+
+    # Best sentences first, skipping any that no longer fit; always keep at least one
+    keep, used = [], 0
+    for i in np.argsort(-scores, kind="stable"):
+        if not keep or used + lengths[i] <= budget:
+            keep.append(i)
+            used += lengths[i]
+    keep.sort()
+
+    passages = {}
+    for i in keep:
+        passage, sentence = sentences[i]
+        passages.setdefault(passage, []).append(sentence)
+    return PASSAGE_SEPARATOR.join(" ".join(passage) for passage in passages.values())
+
+
+def preview_summary(text, sentences=PREVIEW_SENTENCES):
+    """
+    Instant stand-in for an LLM section summary: the lead sentence plus the
+    best-ranked other sentences, in document order.
+    """
+    split = [sentence for _, sentence in split_sentences(text)]
+    if len(split) <= sentences:
+        return " ".join(split)
+    scores = textrank_scores(tfidf_matrix(split))
+    # Opening sentences usually state what the section is about
+    scores[0] = np.inf
+    keep = sorted(np.argsort(-scores, kind="stable")[:sentences])
+    return " ".join(split[i] for i in keep)
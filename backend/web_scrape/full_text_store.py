@@ -0,0 +1,127 @@
+"""
+Compressed store for parsed full-text sections.
+
+Section bodies live in their own collection as one compressed blob per
+article, so `raw_fields_article` documents stay small and list queries do
+not drag megabytes of text along. Readers that need the text (the
+knowledge-graph builder) load it lazily in batches.
+
+Migrate documents written before the split with:
+
+    python -m web_scrape.full_text_store --migrate
+"""
+import argparse
+import json
+import zlib
+
+from bson.binary import Binary
+
+try:
+    import zstandard
+except ImportError:  # zlib ships with Python; zstd is smaller and faster when installed
+    zstandard = None
+
+from .mongo_utils import get_db
+
+FULL_TEXT_COLLECTION = "article_full_text"
+FULL_TEXT_CODEC = "zstd" if zstandard is not None else "zlib"
+FULL_TEXT_SECTIONS = ("abstract", "introduction", "methods", "results", "discussion", "conclusion")
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 6
+
+
+def compress_sections(sections, codec=FULL_TEXT_CODEC):
+    raw = json.dumps(sections, ensure_ascii=False).encode("utf-8")
+    if codec == "zstd":
+        return raw, zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return raw, zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decompress_sections(body, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Full text was stored with zstd; install zstandard to read it")
+        raw = zstandard.ZstdDecompressor().decompress(body)
+    else:
+        raw = zlib.decompress(body)
+    return json.loads(raw)
+
+
+def full_text_document(pmc_id, sections):
+    """The `article_full_text` document for an article's parsed sections; CPU-bound, run it on the executor."""
+    sections = {section: sections[section] for section in FULL_TEXT_SECTIONS if sections.get(section)}
+    raw, body = compress_sections(sections)
+    return {
+        "pmc_id": pmc_id,
+        "codec": FULL_TEXT_CODEC,
+        "sections": list(sections),
+        "bytes": len(raw),
+        "compressed_bytes": len(body),
+        "body": Binary(body),
+    }
+
+
+def slim_article(article, document):
+    """`article` without its section bodies, pointing at the stored full-text `document` instead."""
+    slim = {key: value for key, value in article.items() if key not in FULL_TEXT_SECTIONS and key != "_id"}
+    slim["full_text"] = {
+        "collection": FULL_TEXT_COLLECTION,
+        "codec": document["codec"],
+        "sections": document["sections"],
+        "bytes": document["bytes"],
+        "compressed_bytes": document["compressed_bytes"],
+    }
+    return slim
+
+
+def load_full_text(pmc_ids):
+    """Decompressed sections for `pmc_ids`, by pmc_id."""
+    documents = get_db()[FULL_TEXT_COLLECTION].find(
+        {"pmc_id": {"$in": list(pmc_ids)}}, {"_id": 0, "pmc_id": 1, "codec": 1, "body": 1}
+    )
+    return {document["pmc_id"]: decompress_sections(bytes(document["body"]), document["codec"]) for document in documents}
+
+
+def iter_articles_with_full_text(collection, query=None, batch_size=50):
+    """
+    Articles from `collection` with their sections filled in, loading the
+    full text `batch_size` articles at a time. Documents that still hold
+    their sections inline are passed through as they are.
+    """
+    def attach(batch):
+        texts = load_full_text([article["pmc_id"] for article in batch if "full_text" in article])
+        for article in batch:
+            yield {**article, **texts.get(article.get("pmc_id"), {})}
+
+    batch = []
+    for article in collection.find(query or {}):
+        batch.append(article)
+        if len(batch) >= batch_size:
+            yield from attach(batch)
+            batch = []
+    yield from attach(batch)
+
+
+def migrate_inline_full_text(collection_name="raw_fields_article"):
+    """Move section bodies still stored inline in `collection_name` into the full-text store."""
+    db = get_db()
+    collection = db[collection_name]
+    moved = 0
+    for article in collection.find({"full_text": {"$exists": False}, "pmc_id": {"$exists": True}}):
+        document = full_text_document(article["pmc_id"], article)
+        db[FULL_TEXT_COLLECTION].update_one({"pmc_id": article["pmc_id"]}, {"$set": document}, upsert=True)
+        slim = slim_article(article, document)
+        collection.update_one(
+            {"_id": article["_id"]},
+            {"$set": {"full_text": slim["full_text"]}, "$unset": {section: "" for section in FULL_TEXT_SECTIONS}},
+        )
+        moved += 1
+    print(f"Moved the full text of {moved} articles into {FULL_TEXT_COLLECTION}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--migrate", action="store_true", help="move inline section bodies into the store")
+    args = parser.parse_args()
+    if args.migrate:
+        migrate_inline_full_text()
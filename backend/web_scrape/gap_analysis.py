@@ -1,10 +1,11 @@
 import asyncio
 from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_core.runnables import RunnableLambda
 import json
 import re
 
+from .extractive import compress_text
+from .openai_pool import cached_chat_text
+
 def extract_json_from_response(response_text):
     """
     Extracts JSON from a given response text. The JSON must be enclosed
@@ -81,19 +82,31 @@ gap_analysis_prompt_template = ChatPromptTemplate(
     ]
 )
 
-# Initialize the LLM with chat model
-llm = ChatOpenAI(model="gpt-4o-mini")
+GAP_ANALYSIS_MODEL = "gpt-4o-mini"
+
+# LangChain message types -> OpenAI chat roles
+MESSAGE_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+def build_gap_analysis_messages(input_data):
+    return [
+        {"role": MESSAGE_ROLES[message.type], "content": message.content}
+        for message in gap_analysis_prompt_template.format_messages(**input_data)
+    ]
+
+def validate_gap_response(response_text):
+    # Only responses with a parseable JSON block are worth caching
+    json.loads(extract_json_from_response(response_text) or "")
 
-# Create the complete chain combining prompt and LLM
-gap_analysis_chain = (
-    RunnableLambda(lambda inputs: gap_analysis_prompt_template.format(**inputs)) | llm
-)
-    
 async def analyze_gap(input_data, retries=3):
     for attempt in range(retries):
         try:
-            response = await gap_analysis_chain.ainvoke(input_data)
-            response_text = response.content if hasattr(response, 'content') else str(response)
+            # Served from the LLM cache for a repeated article set, otherwise queued behind the shared governor
+            response_text = await cached_chat_text(
+                caller="analyze_gap",
+                validate=validate_gap_response,
+                model=GAP_ANALYSIS_MODEL,
+                messages=build_gap_analysis_messages(input_data),
+            )
             # Extract JSON from response
             json_code = extract_json_from_response(response_text)
 
@@ -119,9 +132,13 @@ async def analyze_gap(input_data, retries=3):
 
     
 async def perform_gap_analysis(summaries, search_query):
+    # Summaries are normally a few sentences and pass through compress_text unchanged; longer ones are trimmed
     input_data = {
         "summaries": "\n".join(
-            [f"- {summary['title']}: {summary['abstract']} + {summary['methods']} + {summary['discussion']}" for summary in summaries]
+            [
+                f"- {summary['title']}: {compress_text(summary['abstract'])} + {compress_text(summary['methods'])} + {compress_text(summary['discussion'])}"
+                for summary in summaries
+            ]
         ),
         "search_query": search_query
     }
@@ -0,0 +1,81 @@
+"""
+Background search jobs for the web API.
+
+`/web_search` hands the search to a small pool of worker threads and
+returns straight away; each job runs one `main()` event loop and records
+its status, stage and progress on its search session, which the
+`/jobs/<id>` endpoints read back. The job ID is the search ID.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .mongo_utils import create_search_session, new_search_id
+from .scrape_optimized import main
+
+# Searches running at once; each one already fans out to NCBI and OpenAI concurrently
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+# Queued plus running jobs before new searches are turned away
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", 20))
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="search-job")
+# IDs of the searches queued or running
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobExists(Exception):
+    pass
+
+
+def _run_search(query, search_id, on_done):
+    try:
+        asyncio.run(main(query, search_id=search_id))
+    except Exception as e:
+        # main has already marked the session failed with the error
+        print(f"Search job {search_id} failed: {e}")
+    finally:
+        with _pending_lock:
+            _pending.discard(search_id)
+    if on_done is not None:
+        try:
+            on_done(search_id)
+        except Exception as e:
+            print(f"Search job {search_id} callback failed: {e}")
+
+
+def submit_search(query, search_id=None, on_done=None):
+    """
+    Queue a search and return its ID. `on_done(search_id)` runs on the
+    worker once the search has finished, whatever its outcome. An ID that
+    is queued, running or already has a session raises JobExists, so every
+    successful submit starts exactly one search and later calls `on_done`.
+    """
+    search_id = search_id or new_search_id()
+    with _pending_lock:
+        if search_id in _pending:
+            raise JobExists(f"Search {search_id} is already queued or running")
+        if len(_pending) >= JOB_QUEUE_LIMIT:
+            raise JobQueueFull(f"{len(_pending)} searches are already queued or running")
+        # Reserve the slot now; MongoDB is written to outside the lock so a slow write does not block other submits
+        _pending.add(search_id)
+    try:
+        # The session exists before the job is queued so its status can be polled right away
+        if create_search_session(query, search_id, status="queued", exclusive=True) is None:
+            raise JobExists(f"Search {search_id} already exists")
+        _executor.submit(_run_search, query, search_id, on_done)
+    except Exception:
+        with _pending_lock:
+            _pending.discard(search_id)
+        raise
+    return search_id
+
+
+def active_jobs():
+    with _pending_lock:
+        return len(_pending)
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_LLM_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".llm_cache.sqlite3")
+
+
+class SQLiteCache:
+    """
+    Size-bounded key/value store in a single SQLite file.
+
+    Every process on the host that opens the same file shares the entries,
+    so gunicorn workers and background jobs see each other's results.
+    Entries past their TTL are dropped on read, and once the stored values
+    exceed `max_bytes` the least recently used ones are evicted. Hits and
+    misses are counted per caller in the same file.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 ** 2, default_ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, caller TEXT, value TEXT, size INTEGER,"
+            " expires_at REAL, last_access REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS caller_stats (caller TEXT PRIMARY KEY, hits INTEGER, misses INTEGER)")
+        self._db.commit()
+
+    def _record(self, caller, hit):
+        self._db.execute(
+            "INSERT INTO caller_stats (caller, hits, misses) VALUES (?, ?, ?)"
+            " ON CONFLICT(caller) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses",
+            (caller, int(hit), int(not hit)),
+        )
+
+    def get(self, caller, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] is not None and row[1] < now:
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self._record(caller, row is not None)
+            self._db.commit()
+        return row[0] if row is not None else None
+
+    def set(self, caller, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, caller, value, size, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, caller, value, len(value.encode("utf-8")), now + ttl if ttl is not None else None, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        victims = []
+        for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY last_access ASC"):
+            if total <= target:
+                break
+            victims.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM entries WHERE key = ?", victims)
+
+    def stats(self):
+        """Hit rate per caller, across every process sharing the file."""
+        with self._lock:
+            rows = self._db.execute("SELECT caller, hits, misses FROM caller_stats").fetchall()
+            size, entries = self._db.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries").fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "callers": {
+                caller: {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0}
+                for caller, hits, misses in rows
+            },
+        }
+
+
+def completion_key(model, messages, **params):
+    """Hash of the model, request parameters and messages in canonical JSON form."""
+    canonical = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMCache(SQLiteCache):
+    """Completion cache keyed by `completion_key`; values are the completion text."""
+
+    def lookup(self, caller, model, messages, **params):
+        return self.get(caller, completion_key(model, messages, **params))
+
+    def store(self, caller, text, model, messages, **params):
+        self.set(caller, completion_key(model, messages, **params), text)
+
+    async def alookup(self, caller, model, messages, **params):
+        return await asyncio.to_thread(self.lookup, caller, model, messages, **params)
+
+    async def astore(self, caller, text, model, messages, **params):
+        await asyncio.to_thread(self.store, caller, text, model, messages, **params)
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Process-wide completion cache, opened on first use."""
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMCache(
+                os.getenv("LLM_CACHE_PATH", DEFAULT_LLM_CACHE_PATH),
+                max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", 256 * 1024 ** 2)),
+                default_ttl=float(os.getenv("LLM_CACHE_TTL")) if os.getenv("LLM_CACHE_TTL") else None,
+            )
+    return _llm_cache
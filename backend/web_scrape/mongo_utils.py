@@ -1,23 +1,326 @@
-from pymongo import MongoClient
-from dotenv import load_dotenv
+import asyncio
 import os
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import PyMongoError
+
+from .display import DISPLAY_BUILDERS, with_display_fields
 
 load_dotenv()
 
-def save_to_mongodb(articles, collection_name):
-    """Insert multiple articles into MongoDB."""
-    try:
-        mongo_uri = os.getenv("MONGO_URI")
-        client = MongoClient(mongo_uri)
-        client.admin.command('ping')
-        print("Connection successful!")
-    except Exception as e:
-        print(f"Connection failed: {e}")
+MONGO_DB_NAME = "research_articles"
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+# Fail fast when MongoDB is unreachable instead of pymongo's default 30 s
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+# Writes queued by BatchWriter go out once this many are pending, or every interval
+MONGO_BATCH_SIZE = int(os.getenv("MONGO_BATCH_SIZE", 50))
+MONGO_FLUSH_INTERVAL = float(os.getenv("MONGO_FLUSH_INTERVAL", 0.5))
+# Rows per page in the table views
+DISPLAY_PAGE_SIZE = 25
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Process-wide MongoClient. pymongo pools connections and is thread safe,
+    so the scraper, its worker threads and the Flask app all share it and
+    connection setup is paid once per process.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MongoClient(
+                os.getenv("MONGO_URI"),
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            )
+    return _client
+
+
+def get_db():
+    return get_client()[MONGO_DB_NAME]
+
+
+# Fields that identify a document in each collection; writes upsert on them
+COLLECTION_KEYS = {
+    "raw_fields_article": ("pmc_id",),
+    "article_full_text": ("pmc_id",),
+    "summarized_fields_article": ("pmc_id",),
+    "gap_individual_articles": ("search_id", "article_title"),
+    "gap_comparison_section": ("search_id",),
+    "pdf_upload_papers": ("doi_key",),
+}
+
+_indexes_ready = False
+
+
+def ensure_indexes():
+    """Create the unique and lookup indexes the upserts rely on; cheap to call again."""
+    global _indexes_ready
+    if _indexes_ready:
         return
+    db = get_db()
+    for collection_name in ("raw_fields_article", "summarized_fields_article"):
+        db[collection_name].create_index("pmc_id", unique=True)
+        db[collection_name].create_index("doi")
+    db["article_full_text"].create_index("pmc_id", unique=True)
+    db["gap_individual_articles"].create_index([("search_id", 1), ("article_title", 1)], unique=True)
+    db["gap_comparison_section"].create_index("search_id", unique=True)
+    db["search_sessions"].create_index("search_id", unique=True)
+    db["search_sessions"].create_index("created_at")
+    # Uploaded PDFs without a DOI have no doi_key and are simply inserted
+    db["pdf_upload_papers"].create_index(
+        "doi_key", unique=True, partialFilterExpression={"doi_key": {"$type": "string"}}
+    )
+    _indexes_ready = True
+
+
+def doi_key(doi):
+    """Normalised DOI for matching uploads, or None when there is no DOI."""
+    if not doi or not isinstance(doi, str):
+        return None
+    doi = doi.strip().lower()
+    for prefix in ("https://doi.org/", "http://doi.org/", "https://dx.doi.org/", "doi:"):
+        if doi.startswith(prefix):
+            doi = doi[len(prefix):]
+    return doi.strip() or None
+
+
+def save_uploaded_paper(data):
+    """Store a paper extracted from an uploaded PDF and return its `_id`; re-uploads update the same document."""
+    collection = get_db()["pdf_upload_papers"]
+    # Table rows are precomputed here so the Table page can read them with a projection
+    data = with_display_fields("pdf_upload_papers", data)
+
+    # Papers without a DOI cannot be matched to an earlier upload
+    key = doi_key(data.get("doi"))
+    if key is None:
+        return collection.insert_one(data).inserted_id
+
+    data["doi_key"] = key
+    document = collection.find_one_and_update(
+        {"doi_key": key},
+        {"$set": {field: value for field, value in data.items() if field != "_id"}},
+        upsert=True,
+        projection={"_id": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return document["_id"]
+
+
+def upsert_operation(document, keys):
+    """UpdateOne that creates the document or sets its fields; re-writing the same data changes nothing."""
+    fields = {field: value for field, value in document.items() if field != "_id"}
+    return UpdateOne({key: document.get(key) for key in keys}, {"$set": fields}, upsert=True)
+
+
+def save_to_mongodb(articles, collection_name, keys=None):
+    """Upsert multiple articles into MongoDB, keyed on COLLECTION_KEYS (pmc_id by default)."""
+    if not articles:
+        return None
+    keys = keys or COLLECTION_KEYS.get(collection_name, ("pmc_id",))
+    try:
+        result = get_db()[collection_name].bulk_write(
+            [upsert_operation(with_display_fields(collection_name, article), keys) for article in articles], ordered=False
+        )
+    except PyMongoError as e:
+        print(f"Upsert into {collection_name} failed: {e}")
+        return None
+    print(
+        f"{collection_name}: {result.upserted_count} inserted, {result.modified_count} updated, "
+        f"{result.matched_count - result.modified_count} unchanged"
+    )
+    return result
+
+
+def new_search_id():
+    return uuid.uuid4().hex
+
+
+def create_search_session(query, search_id=None, status="running", exclusive=False):
+    """
+    Record a search and return its ID. The session lists the pmc_ids the
+    search selected; the articles themselves are stored once and shared by
+    every session that selects them. It also carries the search's status,
+    current stage and per-stage progress for the job API.
+
+    With `exclusive`, an existing session with the same ID is left as it is
+    and None is returned instead.
+    """
+    search_id = search_id or new_search_id()
+    now = datetime.now(timezone.utc)
+    fields = {"query": query, "status": status, "updated_at": now}
+    defaults = {"pmc_ids": [], "progress": {}, "created_at": now}
+    if exclusive:
+        update = {"$setOnInsert": dict(fields, **defaults)}
+    else:
+        update = {"$set": fields, "$setOnInsert": defaults}
+    result = get_db()["search_sessions"].update_one({"search_id": search_id}, update, upsert=True)
+    if exclusive and result.upserted_id is None:
+        return None
+    return search_id
+
+
+def report_search_progress(search_id, stage, **counts):
+    """Record the session's current stage and that stage's counters."""
+    get_db()["search_sessions"].update_one(
+        {"search_id": search_id},
+        {"$set": {"stage": stage, f"progress.{stage}": counts, "updated_at": datetime.now(timezone.utc)}},
+    )
+
+
+def add_session_articles(search_id, pmc_ids):
+    """Append newly selected articles to a running session."""
+    get_db()["search_sessions"].update_one(
+        {"search_id": search_id},
+        {"$addToSet": {"pmc_ids": {"$each": list(pmc_ids)}}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+    )
+
+
+def finish_search_session(search_id, status="done", pmc_ids=None, error=None):
+    """Mark a session finished; `pmc_ids` replaces its list with the final ranking."""
+    fields = {"status": status, "stage": status, "updated_at": datetime.now(timezone.utc)}
+    if pmc_ids is not None:
+        fields["pmc_ids"] = list(pmc_ids)
+    if error is not None:
+        fields["error"] = error
+    get_db()["search_sessions"].update_one({"search_id": search_id}, {"$set": fields})
+
+
+def get_search_session(search_id):
+    return get_db()["search_sessions"].find_one({"search_id": search_id}, {"_id": 0})
+
+
+def find_session_articles(search_id, collection_name="summarized_fields_article"):
+    """The session's articles from `collection_name`, in the session's order."""
+    session = get_search_session(search_id)
+    if not session:
+        return []
+    pmc_ids = session.get("pmc_ids", [])
+    documents = {document["pmc_id"]: document for document in get_db()[collection_name].find({"pmc_id": {"$in": pmc_ids}})}
+    return [documents[pmc_id] for pmc_id in pmc_ids if pmc_id in documents]
+
+
+def find_session_display_page(search_id, page=0, page_size=DISPLAY_PAGE_SIZE):
+    """
+    One page of a session's table rows, read with a projection of the
+    precomputed `display` fields only. Returns (rows, total articles).
+    """
+    session = get_search_session(search_id)
+    if not session:
+        return [], 0
+    pmc_ids = session.get("pmc_ids", [])
+    page_ids = pmc_ids[page * page_size:(page + 1) * page_size]
+    rows = {
+        document["pmc_id"]: document.get("display", {})
+        for document in get_db()["summarized_fields_article"].find(
+            {"pmc_id": {"$in": page_ids}}, {"_id": 0, "pmc_id": 1, "display": 1}
+        )
+    }
+    return [rows[pmc_id] for pmc_id in page_ids if pmc_id in rows], len(pmc_ids)
+
+
+def find_display_page(collection_name, query=None, page=0, page_size=DISPLAY_PAGE_SIZE):
+    """One page of a collection's `display` rows, newest first. Returns (rows, total documents)."""
+    collection = get_db()[collection_name]
+    query = query or {}
+    cursor = (
+        collection.find(query, {"_id": 0, "display": 1})
+        .sort("_id", -1)
+        .skip(page * page_size)
+        .limit(page_size)
+    )
+    return [document.get("display", {}) for document in cursor], collection.count_documents(query)
+
+
+def backfill_display_fields():
+    """Add `display` to documents written before it existed; a no-op once they all have it."""
+    db = get_db()
+    for collection_name in DISPLAY_BUILDERS:
+        collection = db[collection_name]
+        for document in collection.find({"display": {"$exists": False}}):
+            collection.update_one(
+                {"_id": document["_id"]}, {"$set": {"display": with_display_fields(collection_name, document)["display"]}}
+            )
+
+
+def find_final_summaries(pmc_ids):
+    """LLM summaries already stored for any of `pmc_ids` (previews excluded), by pmc_id."""
+    documents = get_db()["summarized_fields_article"].find(
+        {"pmc_id": {"$in": list(pmc_ids)}, "provisional": {"$ne": True}}, {"_id": 0}
+    )
+    return {document["pmc_id"]: document for document in documents}
+
+
+class BatchWriter:
+    """
+    Collects upserts from the pipeline and sends them per collection as one
+    unordered `bulk_write` on a worker thread, once MONGO_BATCH_SIZE are
+    pending or every MONGO_FLUSH_INTERVAL seconds. `add` only queues the
+    write, so persistence never holds up the stage that produced it.
+    Writes to the same key within a batch are merged into one, so the
+    order inside a batch does not matter.
+
+    Use as `async with BatchWriter() as writer:`; everything still pending
+    is flushed on exit.
+    """
+
+    def __init__(self, batch_size=MONGO_BATCH_SIZE, flush_interval=MONGO_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = {}
+        self.stats = {"documents": 0, "inserted": 0, "updated": 0, "batches": 0, "failures": 0}
+        # Batches go out one at a time so later writes (e.g. a summary replacing its preview) land last
+        self._flush_lock = asyncio.Lock()
+        self._ticker = None
+
+    async def __aenter__(self):
+        self._ticker = asyncio.create_task(self._tick())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._ticker.cancel()
+        try:
+            await self._ticker
+        except asyncio.CancelledError:
+            pass
+        await self.flush()
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
 
-    db = client['research_articles']  # Use 'research_articles' database
-    collection = db[collection_name]  # Use 'gut_microbiome' collection
+    async def add(self, collection_name, document):
+        """Queue an upsert keyed on the collection's COLLECTION_KEYS."""
+        keys = COLLECTION_KEYS.get(collection_name, ("pmc_id",))
+        pending = self.pending.setdefault(collection_name, {})
+        key = tuple(document.get(field) for field in keys)
+        # A later write for the same key (e.g. the summary replacing its preview) wins field by field
+        pending[key] = {**pending[key], **document} if key in pending else document
+        if sum(len(documents) for documents in self.pending.values()) >= self.batch_size:
+            await self.flush()
 
-    # Insert multiple documents into the collection
-    result = collection.insert_many(articles)
-    print(f"Inserted {len(result.inserted_ids)} documents with ids: {result.inserted_ids}")
\ No newline at end of file
+    async def flush(self):
+        async with self._flush_lock:
+            batches, self.pending = self.pending, {}
+            for collection_name, documents in batches.items():
+                keys = COLLECTION_KEYS.get(collection_name, ("pmc_id",))
+                operations = [
+                    upsert_operation(with_display_fields(collection_name, document), keys) for document in documents.values()
+                ]
+                try:
+                    result = await asyncio.to_thread(get_db()[collection_name].bulk_write, operations, ordered=False)
+                    self.stats["documents"] += len(operations)
+                    self.stats["inserted"] += result.upserted_count
+                    self.stats["updated"] += result.modified_count
+                    self.stats["batches"] += 1
+                except PyMongoError as e:
+                    self.stats["failures"] += 1
+                    print(f"Batched write of {len(operations)} documents to {collection_name} failed: {e}")
@@ -0,0 +1,265 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+EUTILS_BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+BIOC_BASE_URL = "https://www.ncbi.nlm.nih.gov/research/bionlp/RESTful/pmcoa.cgi/BioC_xml"
+
+# Documented NCBI limits: 10 requests/second with an API key, 3 without
+RATE_WITH_API_KEY = 10
+RATE_WITHOUT_API_KEY = 3
+# Processes sharing one API key (e.g. gunicorn workers); each gets an equal share of the limit
+NCBI_PROCESSES = int(os.getenv("NCBI_PROCESSES", 1))
+# Fraction of the limit actually used; NCBI counts over a sliding window, so pacing at exactly
+# the limit still lets an extra request into some one-second windows and draws 429s
+NCBI_RATE_HEADROOM = float(os.getenv("NCBI_RATE_HEADROOM", 0.9))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Token bucket shared by every request going to NCBI from this process.
+
+    State is guarded by a thread lock and each caller reserves its slot
+    before sleeping with `asyncio.sleep`, so one bucket paces the separate
+    event loops of concurrent search jobs, in arrival order.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token and return how long to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Tokens may go negative: each reservation queues behind the ones already handed out
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    async def acquire(self):
+        while True:
+            wait = self._reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            with self._lock:
+                # A Retry-After pause that arrived while this caller slept holds it back again
+                if time.monotonic() >= self.blocked_until:
+                    return
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (used when NCBI sends Retry-After)."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = min(self.tokens, 0)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def shared_bucket(rate):
+    """The process-wide bucket for `rate`, so every NCBIClient in the process shares one budget."""
+    with _buckets_lock:
+        if rate not in _buckets:
+            _buckets[rate] = TokenBucket(rate)
+        return _buckets[rate]
+
+
+class CircuitBreaker:
+    """Fails fast once NCBI keeps failing, then lets a single probe through after a cooldown."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.probing or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+
+def parse_retry_after(value):
+    """Return the Retry-After header as seconds, accepting both delta-seconds and HTTP dates."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class NCBIClient:
+    """
+    Shared async client for E-utilities and BioC requests.
+
+    Every request waits for a token from a process-wide bucket sized to
+    NCBI's documented limits, so bursts from `asyncio.gather` are smoothed out
+    before they reach NCBI instead of being answered with 429s. Retries use
+    jittered exponential backoff and honour `Retry-After`, and a circuit
+    breaker stops hammering NCBI while it is unavailable. An optional
+    `ResponseCache` is exposed as `client.cache` for the fetchers to use.
+
+    Usage:
+        async with NCBIClient(api_key) as client:
+            body = await client.eutils("esearch", {...})
+    """
+
+    def __init__(
+        self,
+        api_key=None,
+        rate=None,
+        max_retries=5,
+        backoff_base=0.5,
+        backoff_cap=16.0,
+        timeout=60,
+        eutils_base_url=EUTILS_BASE_URL,
+        bioc_base_url=BIOC_BASE_URL,
+        breaker=None,
+        cache=None,
+    ):
+        self.api_key = api_key
+        self.cache = cache
+        if rate is None:
+            rate = (RATE_WITH_API_KEY if api_key else RATE_WITHOUT_API_KEY) / NCBI_PROCESSES
+        # Only the aiohttp session belongs to this client and its event loop; the rate budget is per process
+        self.bucket = shared_bucket(rate * NCBI_RATE_HEADROOM)
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.eutils_base_url = eutils_base_url.rstrip("/")
+        self.bioc_base_url = bioc_base_url.rstrip("/")
+        self.session = None
+        self.stats = {
+            "requests": 0,
+            "throttled": 0,
+            "retries": 0,
+            "failures": 0,
+            "short_circuited": 0,
+            "bytes_downloaded": 0,
+            "bytes_by_kind": {},
+        }
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _backoff(self, attempt):
+        # Full jitter keeps concurrent retries from lining up into another burst
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def _count_bytes(self, kind, body):
+        self.stats["bytes_downloaded"] += len(body)
+        self.stats["bytes_by_kind"][kind] = self.stats["bytes_by_kind"].get(kind, 0) + len(body)
+
+    async def get(self, url, params=None, label=None, kind="other"):
+        """GET `url` through the limiter. Returns the body as bytes, or None on failure."""
+        label = label or url
+        for attempt in range(self.max_retries):
+            if not self.breaker.allow():
+                self.stats["short_circuited"] += 1
+                print(f"NCBI circuit open, skipping request for {label}")
+                return None
+
+            await self.bucket.acquire()
+            self.stats["requests"] += 1
+            try:
+                async with self.session.get(url, params=params) as response:
+                    status = response.status
+                    if status == 200:
+                        body = await response.read()
+                        self._count_bytes(kind, body)
+                        self.breaker.record_success()
+                        return body
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status, retry_after = None, None
+                print(f"Request for {label} failed: {e!r}")
+
+            if status is not None and status not in RETRYABLE_STATUSES:
+                # 4xx other than 429 is an answer, not an outage
+                self.breaker.record_success()
+                print(f"Request for {label} returned status {status}")
+                return None
+
+            self.breaker.record_failure()
+            if status == 429:
+                self.stats["throttled"] += 1
+            if attempt == self.max_retries - 1:
+                break
+
+            wait_time = retry_after if retry_after is not None else self._backoff(attempt)
+            if retry_after is not None:
+                self.bucket.pause(retry_after)
+            self.stats["retries"] += 1
+            print(f"Retrying {label} in {wait_time:.2f} seconds (status {status}, attempt {attempt + 1})...")
+            await asyncio.sleep(wait_time)
+
+        self.stats["failures"] += 1
+        print(f"Giving up on {label} after {self.max_retries} attempts")
+        return None
+
+    async def eutils(self, tool, params, label=None):
+        """Call an E-utilities endpoint such as `esearch` or `esummary`."""
+        params = dict(params)
+        if self.api_key:
+            params["api_key"] = self.api_key
+        return await self.get(f"{self.eutils_base_url}/{tool}.fcgi", params=params, label=label or tool, kind=tool)
+
+    async def bioc(self, pmc_id):
+        """Fetch the BioC XML full text for a PMC ID."""
+        return await self.get(f"{self.bioc_base_url}/{pmc_id}/unicode", label=pmc_id, kind="bioc")
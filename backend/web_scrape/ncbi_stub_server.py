@@ -0,0 +1,196 @@
+"""
+Local stand-in for the NCBI E-utilities and BioC endpoints.
+
+The stub enforces NCBI's per-second limit itself and answers anything above
+it with a 429 (plus `Retry-After`), the way the real service does during a
+burst. It can also replay a 429 on every Nth request regardless of rate.
+
+Measure throughput under rate limiting (run from `backend/`):
+
+    python -m web_scrape.ncbi_stub_server --requests 60 --limit 10
+
+Serve it for manual testing instead:
+
+    python -m web_scrape.ncbi_stub_server --serve --port 8099
+"""
+import argparse
+import asyncio
+import collections
+import time
+
+import aiohttp
+from aiohttp import web
+
+from .ncbi_client import NCBIClient
+
+ESEARCH_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    "<eSearchResult><Count>{count}</Count><RetMax>{count}</RetMax>"
+    "<IdList>{ids}</IdList></eSearchResult>"
+)
+
+DOCSUM_TEMPLATE = (
+    "<DocSum><Id>{id}</Id>"
+    '<Item Name="PubDate" Type="Date">2024 Jan 01</Item>'
+    '<Item Name="Source" Type="String">Stub Journal</Item>'
+    '<Item Name="AuthorList" Type="List"><Item Name="Author" Type="String">Doe J</Item></Item>'
+    '<Item Name="Title" Type="String">Stub article {id}</Item>'
+    '<Item Name="DOI" Type="String">10.0000/stub.{id}</Item>'
+    "</DocSum>"
+)
+
+BIOC_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?><collection><document><id>{pmc_id}</id>'
+    '<passage><infon key="section_type">ABSTRACT</infon><text>Abstract of {pmc_id}.</text></passage>'
+    '<passage><infon key="section_type">INTRO</infon><text>Introduction of {pmc_id}.</text></passage>'
+    '<passage><infon key="section_type">METHODS</infon><text>Methods of {pmc_id}.</text></passage>'
+    '<passage><infon key="section_type">RESULTS</infon><text>Results of {pmc_id}.</text></passage>'
+    '<passage><infon key="section_type">DISCUSS</infon><text>Discussion of {pmc_id}.</text></passage>'
+    '<passage><infon key="section_type">CONCL</infon><text>Conclusion of {pmc_id}.</text></passage>'
+    "</document></collection>"
+)
+
+
+class StubNCBIServer:
+    def __init__(self, limit=10, retry_after=1, replay_429_every=0, latency=0.05):
+        self.limit = limit
+        self.retry_after = retry_after
+        self.replay_429_every = replay_429_every
+        self.latency = latency
+        self.recent = collections.deque()
+        self.stats = {"requests": 0, "served": 0, "rejected_429": 0}
+        self.runner = None
+        self.port = None
+
+    def _should_reject(self):
+        now = time.monotonic()
+        while self.recent and now - self.recent[0] >= 1.0:
+            self.recent.popleft()
+        self.recent.append(now)
+        if self.replay_429_every and self.stats["requests"] % self.replay_429_every == 0:
+            return True
+        return len(self.recent) > self.limit
+
+    @web.middleware
+    async def rate_limit(self, request, handler):
+        self.stats["requests"] += 1
+        if self._should_reject():
+            self.stats["rejected_429"] += 1
+            return web.Response(
+                status=429,
+                text='{"error":"API rate limit exceeded"}',
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        await asyncio.sleep(self.latency)
+        self.stats["served"] += 1
+        return await handler(request)
+
+    async def esearch(self, request):
+        retmax = int(request.query.get("retmax", 20))
+        ids = "".join(f"<Id>{1000000 + i}</Id>" for i in range(retmax))
+        return web.Response(text=ESEARCH_TEMPLATE.format(count=retmax, ids=ids), content_type="text/xml")
+
+    async def esummary(self, request):
+        ids = request.query.get("id", "").split(",")
+        docsums = "".join(DOCSUM_TEMPLATE.format(id=pmc_id) for pmc_id in ids if pmc_id)
+        return web.Response(
+            text=f'<?xml version="1.0" encoding="UTF-8"?><eSummaryResult>{docsums}</eSummaryResult>',
+            content_type="text/xml",
+        )
+
+    async def bioc(self, request):
+        pmc_id = request.match_info["pmc_id"]
+        return web.Response(text=BIOC_TEMPLATE.format(pmc_id=pmc_id), content_type="text/xml")
+
+    def make_app(self):
+        app = web.Application(middlewares=[self.rate_limit])
+        app.router.add_get("/entrez/eutils/esearch.fcgi", self.esearch)
+        app.router.add_get("/entrez/eutils/esummary.fcgi", self.esummary)
+        app.router.add_get("/bioc/{pmc_id}/unicode", self.bioc)
+        return app
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.runner = web.AppRunner(self.make_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{self.port}"
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def reset_stats(self):
+        self.recent.clear()
+        self.stats = {"requests": 0, "served": 0, "rejected_429": 0}
+
+
+async def _unthrottled_fetch(session, url, attempts=5):
+    # Mirrors the old fetch_full_text: fire immediately, back off only after a 429
+    for attempt in range(attempts):
+        async with session.get(url) as response:
+            if response.status == 200:
+                return await response.read()
+            if response.status != 429:
+                return None
+        await asyncio.sleep(2 ** attempt)
+    return None
+
+
+async def measure(n_requests=60, limit=10, replay_429_every=0):
+    stub = StubNCBIServer(limit=limit, replay_429_every=replay_429_every)
+    base_url = await stub.start()
+    pmc_ids = [f"PMC{1000000 + i}" for i in range(n_requests)]
+    results = {}
+    try:
+        start = time.perf_counter()
+        async with aiohttp.ClientSession() as session:
+            bodies = await asyncio.gather(
+                *[_unthrottled_fetch(session, f"{base_url}/bioc/{pmc_id}/unicode") for pmc_id in pmc_ids]
+            )
+        results["unthrottled"] = (time.perf_counter() - start, sum(b is not None for b in bodies), dict(stub.stats))
+
+        stub.reset_stats()
+        start = time.perf_counter()
+        async with NCBIClient(
+            rate=limit, eutils_base_url=f"{base_url}/entrez/eutils", bioc_base_url=f"{base_url}/bioc"
+        ) as client:
+            bodies = await asyncio.gather(*[client.bioc(pmc_id) for pmc_id in pmc_ids])
+        results["token_bucket"] = (time.perf_counter() - start, sum(b is not None for b in bodies), dict(stub.stats))
+    finally:
+        await stub.stop()
+
+    print(f"{n_requests} BioC fetches against a stub limited to {limit} req/s")
+    for name, (elapsed, ok, stats) in results.items():
+        print(
+            f"  {name:<13} {elapsed:6.2f}s  {ok}/{n_requests} ok  "
+            f"{ok / elapsed:5.1f} articles/s  429s served: {stats['rejected_429']}"
+        )
+    return results
+
+
+async def serve(port, limit, replay_429_every):
+    stub = StubNCBIServer(limit=limit, replay_429_every=replay_429_every)
+    base_url = await stub.start(port=port)
+    print(f"Stub NCBI listening on {base_url} (eutils: {base_url}/entrez/eutils, BioC: {base_url}/bioc)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--limit", type=int, default=10, help="requests per second the stub accepts")
+    parser.add_argument("--replay-429-every", type=int, default=0, help="also answer every Nth request with 429")
+    parser.add_argument("--serve", action="store_true", help="run the stub until interrupted")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    if args.serve:
+        asyncio.run(serve(args.port, args.limit, args.replay_429_every))
+    else:
+        asyncio.run(measure(args.requests, args.limit, args.replay_429_every))
@@ -0,0 +1,219 @@
+import asyncio
+import collections
+import os
+import threading
+import time
+import weakref
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from .llm_cache import get_llm_cache
+
+load_dotenv()
+
+# Our organisation's quota for the models we call; override per deployment
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", 500))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", 200_000))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 16))
+
+WINDOW_SECONDS = 60.0
+POLL_INTERVAL = 0.05
+# Completion size assumed for requests that do not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 1000
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English prose
+    return len(text) // 4 + 1
+
+
+# tiktoken encodings, loaded on first use; None marks a model whose encoding is unavailable
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def get_encoding(model):
+    with _encodings_lock:
+        if model not in _encodings:
+            try:
+                import tiktoken
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except Exception as e:
+                # tiktoken missing, model unknown, or the BPE file cannot be downloaded
+                print(f"No tiktoken encoding for {model}, estimating token counts instead: {e!r}")
+                _encodings[model] = None
+        return _encodings[model]
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    """Exact token count with tiktoken when available, otherwise `estimate_tokens`."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode_ordinary(text))
+
+
+def estimate_request_tokens(request):
+    """Prompt estimate plus the completion budget, which is what counts against TPM."""
+    prompt_tokens = sum(estimate_tokens(str(message.get("content", ""))) for message in request.get("messages", []))
+    return prompt_tokens + request.get("max_tokens", DEFAULT_COMPLETION_TOKENS)
+
+
+class RateGovernor:
+    """
+    Local limiter for OpenAI requests per minute, tokens per minute and
+    in-flight requests, so bursts queue here instead of coming back as 429s.
+
+    State is guarded by a thread lock and waiters poll with `asyncio.sleep`,
+    so one governor works across the separate event loops that Flask
+    request threads start with `asyncio.run`.
+    """
+
+    def __init__(self, rpm=OPENAI_RPM_LIMIT, tpm=OPENAI_TPM_LIMIT, max_concurrency=OPENAI_MAX_CONCURRENCY):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.window = collections.deque()  # [timestamp, tokens] per admitted request
+        self.window_tokens = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.counters = {"requests": 0, "waited": 0, "total_wait_seconds": 0.0, "max_wait_seconds": 0.0}
+        self.by_caller = collections.Counter()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self.window and now - self.window[0][0] >= WINDOW_SECONDS:
+            self.window_tokens -= self.window.popleft()[1]
+
+    def _try_admit(self, tokens):
+        """Admit the request or return how long to wait before trying again."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if self.in_flight >= self.max_concurrency:
+                return POLL_INTERVAL
+            # A single request larger than the whole TPM budget is let through on an empty window
+            over_tpm = self.window and self.window_tokens + tokens > self.tpm
+            if len(self.window) >= self.rpm or over_tpm:
+                return max(POLL_INTERVAL, WINDOW_SECONDS - (now - self.window[0][0]))
+            entry = [now, tokens]
+            self.window.append(entry)
+            self.window_tokens += tokens
+            self.in_flight += 1
+            return entry
+
+    async def acquire(self, tokens, caller="default"):
+        """Wait for capacity; returns a handle to pass to `release`."""
+        start = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        try:
+            while True:
+                result = self._try_admit(tokens)
+                if isinstance(result, list):
+                    break
+                await asyncio.sleep(result)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        waited = time.monotonic() - start
+        with self._lock:
+            self.counters["requests"] += 1
+            self.by_caller[caller] += 1
+            if waited > POLL_INTERVAL:
+                self.counters["waited"] += 1
+            self.counters["total_wait_seconds"] += waited
+            self.counters["max_wait_seconds"] = max(self.counters["max_wait_seconds"], waited)
+        return result
+
+    def release(self, handle, actual_tokens=None):
+        with self._lock:
+            self.in_flight -= 1
+            # Only adjust entries that are still inside the window (expired ones were popped from the left)
+            if actual_tokens is not None and self.window and handle[0] >= self.window[0][0]:
+                # Replace the estimate with what the API reports
+                self.window_tokens += actual_tokens - handle[1]
+                handle[1] = actual_tokens
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            requests = self.counters["requests"]
+            return {
+                "queue_depth": self.waiting,
+                "in_flight": self.in_flight,
+                "requests_last_minute": len(self.window),
+                "tokens_last_minute": self.window_tokens,
+                "requests": requests,
+                "waited": self.counters["waited"],
+                "avg_wait_seconds": self.counters["total_wait_seconds"] / requests if requests else 0.0,
+                "max_wait_seconds": self.counters["max_wait_seconds"],
+                "by_caller": dict(self.by_caller),
+            }
+
+
+governor = RateGovernor()
+
+# httpx connection pools belong to the event loop that opened them, so
+# there is one pooled client per running loop, shared by every caller on it
+_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=OPENAI_MAX_CONCURRENCY, max_keepalive_connections=OPENAI_MAX_CONCURRENCY),
+                    timeout=httpx.Timeout(120.0, connect=10.0),
+                ),
+            )
+            _clients[loop] = client
+    return client
+
+
+async def chat_completion(caller="default", **request):
+    """`client.chat.completions.create(**request)` on the shared client, governed by RPM/TPM limits."""
+    handle = await governor.acquire(estimate_request_tokens(request), caller=caller)
+    actual_tokens = None
+    try:
+        response = await get_async_client().chat.completions.create(**request)
+        if getattr(response, "usage", None) is not None:
+            actual_tokens = response.usage.total_tokens
+        return response
+    finally:
+        governor.release(handle, actual_tokens)
+
+
+async def close_async_client():
+    """Close the current loop's client; call before the loop that created it shuts down."""
+    with _clients_lock:
+        client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+async def cached_chat_text(caller="default", validate=None, **request):
+    """
+    Completion text for `request`, served from the persistent LLM cache when
+    the same model, parameters and messages were sent before. Responses are
+    only cached if `validate(text)` (when given) does not raise.
+    """
+    cache = get_llm_cache()
+    params = {key: value for key, value in request.items() if key not in ("model", "messages")}
+    cached = await cache.alookup(caller, request["model"], request["messages"], **params)
+    if cached is not None:
+        return cached
+
+    response = await chat_completion(caller=caller, **request)
+    text = response.choices[0].message.content
+    if validate is not None:
+        validate(text)
+    await cache.astore(caller, text, request["model"], request["messages"], **params)
+    return text
@@ -0,0 +1,97 @@
+import asyncio
+
+# Sentinel closing a stage queue
+DONE = object()
+
+
+async def stage(inbox, handler, workers=1, outbox=None):
+    """
+    Run `workers` tasks that call `await handler(item)` for every item in
+    `inbox` until DONE arrives, then close `outbox` (if any) so the next
+    stage can finish too. Handlers put their own results on the next queue.
+    """
+    async def work():
+        while True:
+            item = await inbox.get()
+            if item is DONE:
+                # Put it back so sibling workers see it as well
+                await inbox.put(DONE)
+                return
+            try:
+                await handler(item)
+            except Exception as e:
+                print(f"Pipeline stage {handler.__name__} failed on an item: {e!r}")
+
+    await asyncio.gather(*[work() for _ in range(workers)])
+    if outbox is not None:
+        await outbox.put(DONE)
+
+
+async def feed(items, outbox):
+    for item in items:
+        await outbox.put(item)
+    await outbox.put(DONE)
+
+
+class TopKSelector:
+    """
+    Decides, while articles are still arriving, which ones are certain to
+    end up in the top `k` by `(filled_sections_count, score)`.
+
+    Candidates are given up front in score order. A parsed article is
+    secured once fewer than `k` articles can still rank above it: parsed
+    (or already secured) articles with a better key, plus pending candidates whose best possible
+    key (every section filled, their known score) is better. Ties keep the
+    candidates' original order, matching a stable sort of the whole batch.
+    """
+
+    def __init__(self, candidates, k):
+        self.k = k
+        self.rank = {id(article): i for i, article in enumerate(candidates)}
+        self.pending = {id(article): article for article in candidates}
+        self.finished = {}
+        self.secured = []
+
+    def _key(self, article, filled=None):
+        if filled is None:
+            filled = article['filled_sections_count']
+        return (filled, article['score'], -self.rank[id(article)])
+
+    def _can_beat_count(self, article):
+        key = self._key(article)
+        beaters = sum(1 for other in self.secured if self._key(other) > key)
+        beaters += sum(1 for other in self.finished.values() if self._key(other) > key)
+        beaters += sum(1 for other in self.pending.values() if self._key(other, filled=1.0) > key)
+        return beaters
+
+    def _release(self):
+        released = []
+        for article_id, article in list(self.finished.items()):
+            if self._can_beat_count(article) < self.k:
+                released.append(article)
+                del self.finished[article_id]
+                self.secured.append(article)
+        # Once k articles are secured nothing else can get in
+        if len(self.secured) >= self.k:
+            self.finished.clear()
+        return released
+
+    def add(self, article):
+        """Record a parsed article; returns the articles that became secured."""
+        self.pending.pop(id(article), None)
+        if len(self.secured) >= self.k:
+            return []
+        self.finished[id(article)] = article
+        return self._release()
+
+    def discard(self, article):
+        """Record that a candidate has no usable full text; returns newly secured articles."""
+        self.pending.pop(id(article), None)
+        if len(self.secured) >= self.k:
+            return []
+        return self._release()
+
+    @property
+    def complete(self):
+        """True once the top k is settled and the remaining candidates cannot change it."""
+        return len(self.secured) >= self.k or (not self.pending and not self.finished)
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ncbi_cache")
+
+
+class ResponseCache:
+    """
+    Persistent, content-addressed cache for NCBI response bodies.
+
+    Bodies are zlib-compressed and stored under `objects/` named by the
+    SHA-256 of their content, so identical responses are stored once. A
+    small SQLite index maps cache keys (namespace + key parts) to content
+    digests together with an expiry time and the last access time, which
+    drives LRU eviction once the stored size exceeds `max_bytes`.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=2 * 1024 ** 3, default_ttl=None):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, "objects")
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.stats = {"hits": {}, "misses": {}, "evictions": 0}
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # Lookups run on worker threads, so the counters get their own lock
+        self._stats_lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, namespace TEXT, digest TEXT, size INTEGER,"
+            " expires_at REAL, last_access REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._db.commit()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            directory=os.getenv("NCBI_CACHE_DIR", DEFAULT_CACHE_DIR),
+            max_bytes=int(os.getenv("NCBI_CACHE_MAX_BYTES", 2 * 1024 ** 3)),
+        )
+
+    @staticmethod
+    def make_key(namespace, *parts):
+        return namespace + ":" + "\x1f".join(str(part) for part in parts)
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _count(self, kind, namespace):
+        with self._stats_lock:
+            self.stats[kind][namespace] = self.stats[kind].get(namespace, 0) + 1
+
+    def get(self, namespace, *parts):
+        """Return the cached body for the key, or None if it is missing or expired."""
+        key = self.make_key(namespace, *parts)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT digest, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                self._count("misses", namespace)
+                return None
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        try:
+            with open(self._object_path(row[0]), "rb") as f:
+                body = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            self._count("misses", namespace)
+            return None
+        self._count("hits", namespace)
+        return body
+
+    def set(self, namespace, *parts, body, ttl=None):
+        key = self.make_key(namespace, *parts)
+        ttl = ttl if ttl is not None else self.default_ttl
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            compressed = zlib.compress(body, 6)
+            with open(tmp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+            size = len(compressed)
+        else:
+            size = os.path.getsize(path)
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT digest FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, namespace, digest, size, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, namespace, digest, size, now + ttl if ttl is not None else None, now),
+            )
+            if old is not None and old[0] != digest:
+                self._remove_object_if_unused(old[0])
+            self._db.commit()
+            self._evict()
+
+    def _remove_object_if_unused(self, digest):
+        in_use = self._db.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+        if in_use is None:
+            try:
+                os.remove(self._object_path(digest))
+            except OSError:
+                pass
+
+    def _evict(self):
+        # Drop expired entries first, then least recently used ones down to 90% of the cap
+        now = time.time()
+        victims = {
+            key: (digest, size)
+            for key, digest, size in self._db.execute(
+                "SELECT key, digest, size FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (now,)
+            )
+        }
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        total -= sum(size for _, size in victims.values())
+        if total > self.max_bytes:
+            target = self.max_bytes * 0.9
+            for key, digest, size in self._db.execute(
+                "SELECT key, digest, size FROM entries ORDER BY last_access ASC"
+            ).fetchall():
+                if total <= target:
+                    break
+                if key not in victims:
+                    victims[key] = (digest, size)
+                    total -= size
+        for key, (digest, _) in victims.items():
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._remove_object_if_unused(digest)
+            with self._stats_lock:
+                self.stats["evictions"] += 1
+        self._db.commit()
+
+    def size(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
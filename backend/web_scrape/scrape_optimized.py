@@ -1,5 +1,6 @@
 import asyncio
-import aiohttp
+import io
+import json
 import xml.etree.ElementTree as ET
 import re
 from datetime import datetime
@@ -7,17 +8,60 @@ import time
 import openai
 from dotenv import load_dotenv
 import os
-from openai import OpenAI
+import threading
 from datetime import datetime
 
+from .cpu_pool import SCRAPER_POOL_WORKERS, run_cpu
+from .extractive import PASSAGE_SEPARATOR, compress_text, preview_summary
+from .full_text_store import FULL_TEXT_COLLECTION, full_text_document, slim_article
 from .gap_analysis import perform_gap_analysis
-from .mongo_utils import save_to_mongodb
+from .mongo_utils import (
+    BatchWriter,
+    add_session_articles,
+    create_search_session,
+    ensure_indexes,
+    find_final_summaries,
+    finish_search_session,
+    new_search_id,
+    report_search_progress,
+)
+from .ncbi_client import NCBIClient
+from .llm_cache import get_llm_cache
+from .openai_pool import cached_chat_text, close_async_client, count_tokens, governor
+from .pipeline import DONE, TopKSelector, feed, stage
+from .response_cache import ResponseCache
 
 load_dotenv()
 
 NCBI_API_KEY = os.getenv("NCBI_API_KEY")
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# E-utilities accept up to 200 UIDs per esummary GET request
+ESUMMARY_MAX_BATCH_SIZE = 200
+ESUMMARY_BATCH_SIZE = int(os.getenv("ESUMMARY_BATCH_SIZE", ESUMMARY_MAX_BATCH_SIZE))
+
+# Search results change daily, article metadata and full text rarely do
+ESEARCH_CACHE_TTL = int(os.getenv("NCBI_ESEARCH_CACHE_TTL", 15 * 60))
+ARTICLE_CACHE_TTL = int(os.getenv("NCBI_ARTICLE_CACHE_TTL", 30 * 24 * 3600))
+
+# Concurrent downloads (the NCBI client's token bucket still sets the pace) and stage queue bound
+FETCH_WORKERS = int(os.getenv("SCRAPER_FETCH_WORKERS", 8))
+PIPELINE_QUEUE_SIZE = int(os.getenv("SCRAPER_QUEUE_SIZE", 16))
+
+# How many candidates to search for, how many articles to keep, and how many to fetch per wave
+SEARCH_RETMAX = int(os.getenv("SCRAPER_RETMAX", 20))
+TOP_K = int(os.getenv("SCRAPER_TOP_K", 5))
+FETCH_WAVE_SIZE = int(os.getenv("SCRAPER_FETCH_WAVE_SIZE", 5))
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Process-wide NCBI response cache, opened on first use."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache.from_env()
+    return _response_cache
 
 def clean_parsed_sections(text):
     text = text.replace('Â', '').replace('â', '').replace('â\x80\x93', '-')  # Fix common encoding issues
@@ -27,142 +71,444 @@ def clean_parsed_sections(text):
     text = re.sub(r'\s+([.,!?;])', r'\1', text)  # Remove space before punctuation
     return text
 
-async def fetch_full_text(session, pmc_id):
-    url = f"https://www.ncbi.nlm.nih.gov/research/bionlp/RESTful/pmcoa.cgi/BioC_xml/{pmc_id}/unicode"
-    for attempt in range(5):  # Retry up to 5 times
-        async with session.get(url) as response:
-            if response.status == 200:
-                return await response.read()
-            elif response.status == 429:  # Rate limit exceeded
-                wait_time = 2 ** attempt
-                print(f"Rate limit exceeded for {pmc_id}. Retrying in {wait_time} seconds...")
-                await asyncio.sleep(wait_time)
-                continue
-            else:
-                print(f"Failed to retrieve full text for {pmc_id}. Status: {response.status}")
-                return None
-    return None
-
-async def search_open_access_articles(session, query, retmax):
-    url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+async def fetch_full_text(client, pmc_id):
+    """Download the BioC XML once; None means the full text is not available."""
+    if client.cache is not None:
+        cached = await asyncio.to_thread(client.cache.get, "bioc", pmc_id)
+        if cached is not None:
+            return cached
+    full_text = await client.bioc(pmc_id)
+    if full_text is None:
+        print(f"Full text not available for {pmc_id}.")
+    elif client.cache is not None:
+        await asyncio.to_thread(client.cache.set, "bioc", pmc_id, body=full_text, ttl=ARTICLE_CACHE_TTL)
+    return full_text
+
+async def search_open_access_articles(client, query, retmax):
+    cache_key = (normalize_query(query), retmax)
+    if client.cache is not None:
+        cached = await asyncio.to_thread(client.cache.get, "esearch", *cache_key)
+        if cached is not None:
+            return cached
     params = {
         'db': 'pmc',
         'term': query,
         'retmode': 'xml',
         'retmax': retmax,
-        'api_key': NCBI_API_KEY
     }
-    async with session.get(url, params=params) as response:
-        if response.status == 200:
-            return await response.read()
-        print(f"Failed to retrieve search results. Status code: {response.status}")
-        return None
+    search_results = await client.eutils('esearch', params, label=f"esearch '{query}'")
+    if search_results is None:
+        print("Failed to retrieve search results.")
+    elif client.cache is not None:
+        await asyncio.to_thread(client.cache.set, "esearch", *cache_key, body=search_results, ttl=ESEARCH_CACHE_TTL)
+    return search_results
 
 
-async def fetch_article_metadata(session, pmc_id, retries=3, delay=0.5):
-    url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi"
+async def fetch_article_metadata_batch(client, pmc_ids):
     params = {
         'db': 'pmc',
-        'id': pmc_id.replace("PMC", ""),  # Remove "PMC" prefix for the API call
+        'id': ",".join(pmc_id.replace("PMC", "") for pmc_id in pmc_ids),  # Remove "PMC" prefix for the API call
         'retmode': 'xml',
-        'api_key': NCBI_API_KEY
     }
-    for attempt in range(retries):
-        async with session.get(url, params=params) as response:
-            if response.status == 200:
-                return await response.read()
-            elif response.status == 429:
-                print(f"Rate limit exceeded for {pmc_id}. Retrying (attempt {attempt + 1})...")
-                await asyncio.sleep(delay)
-                delay *= 2  # Increase delay for next attempt
-    print(f"Failed to fetch metadata for {pmc_id}. Status code: {response.status}")
-    return None
+    metadata = await client.eutils('esummary', params, label=f"esummary {pmc_ids[0]} (+{len(pmc_ids) - 1})")
+    if metadata is None:
+        print(f"Failed to fetch metadata for {', '.join(pmc_ids)}.")
+    return metadata
 
-def parse_metadata(xml_content):
+async def fetch_article_metadata(client, pmc_id):
+    return await fetch_article_metadata_batch(client, [pmc_id])
+
+def store_docsums(cache, metadata_results):
+    """Cache every DocSum of the esummary responses under its own PMC ID."""
+    for metadata_xml in metadata_results:
+        if metadata_xml:
+            for pmc_id, docsum in split_docsums(metadata_xml).items():
+                cache.set("esummary", pmc_id, body=docsum, ttl=ARTICLE_CACHE_TTL)
+
+async def fetch_metadata_in_batches(client, pmc_ids, batch_size=ESUMMARY_BATCH_SIZE):
+    """
+    Fetch esummary XML for `pmc_ids` with one request per batch of comma-joined IDs.
+
+    DocSums already in the response cache are served from it and returned
+    together as one extra eSummaryResult document; only the remaining IDs
+    are requested from NCBI.
+    """
+    cached_docsums = []
+    missing_ids = list(pmc_ids)
+    if client.cache is not None:
+        cached = await asyncio.to_thread(lambda: {pmc_id: client.cache.get("esummary", pmc_id) for pmc_id in pmc_ids})
+        cached_docsums = [docsum for docsum in cached.values() if docsum is not None]
+        missing_ids = [pmc_id for pmc_id, docsum in cached.items() if docsum is None]
+
+    batch_size = max(1, min(batch_size, ESUMMARY_MAX_BATCH_SIZE))
+    batches = [missing_ids[i:i + batch_size] for i in range(0, len(missing_ids), batch_size)]
+    results = await asyncio.gather(*[fetch_article_metadata_batch(client, batch) for batch in batches])
+
+    if client.cache is not None:
+        await asyncio.to_thread(store_docsums, client.cache, results)
+    if cached_docsums:
+        results.append(b"<eSummaryResult>" + b"".join(cached_docsums) + b"</eSummaryResult>")
+    return results
+
+def _parse_docsum(docsum):
     metadata = {}
-    root = ET.fromstring(xml_content)
-    docsum = root.find('.//DocSum')
-    
-    if docsum is not None:
-        metadata["article_id"] = docsum.find('Id').text if docsum.find('Id') is not None else ""
-        metadata["title"] = docsum.find('Item[@Name="Title"]').text if docsum.find('Item[@Name="Title"]') is not None else "No Title Available"
-        metadata["authors"] = [author.text for author in docsum.findall('Item[@Name="AuthorList"]/Item[@Name="Author"]')]
-        metadata["publication_date"] = docsum.find('Item[@Name="PubDate"]').text if docsum.find('Item[@Name="PubDate"]') is not None else ""
-        metadata["journal_name"] = docsum.find('Item[@Name="Source"]').text if docsum.find('Item[@Name="Source"]') is not None else ""
-        metadata["doi"] = docsum.find('Item[@Name="DOI"]').text if docsum.find('Item[@Name="DOI"]') is not None else "No DOI Available"
+    metadata["article_id"] = docsum.find('Id').text if docsum.find('Id') is not None else ""
+    metadata["title"] = docsum.find('Item[@Name="Title"]').text if docsum.find('Item[@Name="Title"]') is not None else "No Title Available"
+    metadata["authors"] = [author.text for author in docsum.findall('Item[@Name="AuthorList"]/Item[@Name="Author"]')]
+    metadata["publication_date"] = docsum.find('Item[@Name="PubDate"]').text if docsum.find('Item[@Name="PubDate"]') is not None else ""
+    metadata["journal_name"] = docsum.find('Item[@Name="Source"]').text if docsum.find('Item[@Name="Source"]') is not None else ""
+    metadata["doi"] = docsum.find('Item[@Name="DOI"]').text if docsum.find('Item[@Name="DOI"]') is not None else "No DOI Available"
     return metadata
 
-async def check_full_text_availability(session, pmc_id):
-    url = f"https://www.ncbi.nlm.nih.gov/research/bionlp/RESTful/pmcoa.cgi/BioC_xml/{pmc_id}/unicode"
-    async with session.get(url) as response:
-        return response.status == 200
+def parse_metadata(xml_content):
+    root = ET.fromstring(xml_content)
+    docsum = root.find('.//DocSum')
+    return _parse_docsum(docsum) if docsum is not None else {}
 
-async def summarize_sections(article):
-    sections_to_summarize = ['introduction', 'abstract', 'methods', 'results', 'discussion', 'conclusion']
-    summaries = {}
+def split_docsums(xml_content):
+    """Split an esummary response into standalone DocSum XML fragments keyed by PMC ID."""
+    root = ET.fromstring(xml_content)
+    docsums = {}
+    for docsum in root.iter('DocSum'):
+        article_id = docsum.findtext('Id')
+        if article_id:
+            docsums[f"PMC{article_id}"] = ET.tostring(docsum, encoding="utf-8")
+    return docsums
+
+def parse_metadata_batch(xml_content):
+    """Split a multi-DocSum esummary response into per-article metadata dicts keyed by PMC ID."""
+    root = ET.fromstring(xml_content)
+    articles = {}
+    for docsum in root.iter('DocSum'):
+        metadata = _parse_docsum(docsum)
+        if metadata["article_id"]:
+            metadata["pmc_id"] = f"PMC{metadata['article_id']}"
+            articles[metadata["pmc_id"]] = metadata
+    return articles
+
+SECTIONS_TO_SUMMARIZE = ['introduction', 'abstract', 'methods', 'results', 'discussion', 'conclusion']
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_SYSTEM_PROMPT = "You are a research summarizing assistant who generates concise, formatted summaries."
+SUMMARY_STYLE_RULES = (
+    "Avoid unnecessary numbers, percentages, or statistical data unless they are critical to understanding the results. "
+    "Focus only on key points, avoiding fillers or redundant phrasing like 'this study' and numbers can represent numerically and you MUST AVOID extra words or punctuation or SQUARE BRACKETS in the front and end of sentence that do not add any meaning. "
+    "Ensure the summary is concise and suitable for presentation in a table. "
+)
+# Input tokens allowed in a single all-sections request (gpt-4o-mini has a 128k context window)
+SUMMARY_CONTEXT_BUDGET = int(os.getenv("SUMMARY_CONTEXT_BUDGET", 100_000))
+# Sections longer than this are map-reduced: summarized in chunks, then merged
+SUMMARY_SECTION_MAX_TOKENS = int(os.getenv("SUMMARY_SECTION_MAX_TOKENS", 8000))
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", 4000))
+SUMMARY_CHUNK_MAX_TOKENS = 250
+# Tokens (inputs plus completion limits) all summarization requests for one article may use
+SUMMARY_ARTICLE_TOKEN_BUDGET = int(os.getenv("SUMMARY_ARTICLE_TOKEN_BUDGET", 60_000))
+# Instructions and system prompt around the content of each request
+SUMMARY_PROMPT_OVERHEAD = 250
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+async def summarize_section(section, content):
+    # Prompt designed for concise, well-formatted summarization for table display
+    prompt = (
+        f"Summarize the {section} section of the scientific research article below in no more than 2-3 sentences in a concise way. "
+        + SUMMARY_STYLE_RULES +
+        f"Here is the content:\n\n{content}\n\n"
+        "Return the summary in the following format:\n"
+        f"[Summary here]"
+    )
+
+    summary = await cached_chat_text(
+        caller="summarize_sections",
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=1100  # Set an appropriate limit for concise summaries
+    )
+    return summary.strip()
+
+async def summarize_sections_batched(sections):
+    """Summarize every section in one request, returning a JSON object keyed by section name."""
+    section_blocks = "\n\n".join(f"### {section}\n{content}" for section, content in sections.items())
+    prompt = (
+        "Summarize each section of the scientific research article below in no more than 2-3 sentences in a concise way. "
+        + SUMMARY_STYLE_RULES +
+        "Summarize every section on its own, using only that section's content. "
+        f"Here are the sections:\n\n{section_blocks}"
+    )
+    schema = {
+        "type": "object",
+        "properties": {section: {"type": "string"} for section in sections},
+        "required": list(sections),
+        "additionalProperties": False,
+    }
 
-    for section in sections_to_summarize:
-        if section in article:
-            # Prompt designed for concise, well-formatted summarization for table display
-            prompt = (
-                f"Summarize the {section} section of the scientific research article below in no more than 2-3 sentences in a concise way. "
-                "Avoid unnecessary numbers, percentages, or statistical data unless they are critical to understanding the results. "
-                "Focus only on key points, avoiding fillers or redundant phrasing like 'this study' and numbers can represent numerically and you MUST AVOID extra words or punctuation or SQUARE BRACKETS in the front and end of sentence that do not add any meaning. "
-                "Ensure the summary is concise and suitable for presentation in a table. "
-                f"Here is the content:\n\n{article[section]}\n\n"
-                "Return the summary in the following format:\n"
-                f"[Summary here]"
-            )
+    content = await cached_chat_text(
+        caller="summarize_sections",
+        validate=json.loads,
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "section_summaries", "strict": True, "schema": schema},
+        },
+        max_tokens=300 * len(sections)
+    )
+    summaries = json.loads(content)
+    return {section: summaries[section].strip() for section in sections}
+
+async def summarize_chunk(section, content, part, parts):
+    """Map step: condense one chunk of an oversized section."""
+    prompt = (
+        f"Below is part {part} of {parts} of the {section} section of a scientific research article. "
+        "Summarize it in 3-5 sentences, keeping its key methods, findings and conclusions so the parts can be merged later. "
+        + SUMMARY_STYLE_RULES +
+        f"Here is the content:\n\n{content}"
+    )
+
+    summary = await cached_chat_text(
+        caller="summarize_chunks",
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=SUMMARY_CHUNK_MAX_TOKENS
+    )
+    return summary.strip()
+
+def _pack(pieces, max_tokens, separator):
+    """Greedily group (text, tokens) pieces into chunks of at most `max_tokens`."""
+    chunks, current, current_tokens = [], [], 0
+    for piece, tokens in pieces:
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append((separator.join(current), current_tokens))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append((separator.join(current), current_tokens))
+    return chunks
+
+def split_passages(text, max_tokens=SUMMARY_CHUNK_TOKENS):
+    """
+    Split a parsed section into (text, tokens) chunks on passage boundaries.
+    A single passage longer than `max_tokens` is split between sentences.
+    """
+    pieces = []
+    for passage in text.split(PASSAGE_SEPARATOR):
+        tokens = count_tokens(passage)
+        if tokens <= max_tokens:
+            pieces.append((passage, tokens))
+        else:
+            sentences = [(sentence, count_tokens(sentence)) for sentence in _SENTENCE_END.split(passage)]
+            pieces.extend(_pack(sentences, max_tokens, " "))
+    return _pack(pieces, max_tokens, PASSAGE_SEPARATOR)
+
+def _is_map_reduced(chunks):
+    return sum(tokens for _, tokens in chunks) > SUMMARY_SECTION_MAX_TOKENS
+
+def _section_cost(chunks):
+    if not _is_map_reduced(chunks):
+        return sum(tokens for _, tokens in chunks)
+    # One map request per chunk, and its partial summary is input to the final request
+    return sum(tokens + SUMMARY_PROMPT_OVERHEAD + 2 * SUMMARY_CHUNK_MAX_TOKENS for _, tokens in chunks)
+
+def plan_summary(sections, budget=SUMMARY_ARTICLE_TOKEN_BUDGET):
+    """
+    Split each section into passage chunks and trim them until summarizing
+    the article fits in `budget` tokens.
+
+    Every request is costed as its input plus its completion limit. While
+    the article is over budget, the last chunk of the most expensive
+    section is dropped, so every section keeps its opening passages for as
+    long as possible. Returns ({section: chunks}, report).
+    """
+    plan = {section: split_passages(content) for section, content in sections.items()}
+    total_tokens = sum(tokens for chunks in plan.values() for _, tokens in chunks)
+
+    def planned():
+        final_request = SUMMARY_PROMPT_OVERHEAD + 300 * len(plan)
+        return final_request + sum(_section_cost(chunks) for chunks in plan.values())
+
+    while plan and planned() > budget:
+        section = max(plan, key=lambda section: _section_cost(plan[section]))
+        plan[section].pop()
+        if not plan[section]:
+            del plan[section]
+
+    kept_tokens = sum(tokens for chunks in plan.values() for _, tokens in chunks)
+    report = {
+        "budget": budget,
+        "planned_tokens": planned() if plan else 0,
+        "input_tokens": total_tokens,
+        "dropped_tokens": total_tokens - kept_tokens,
+        "map_reduced": [section for section, chunks in plan.items() if _is_map_reduced(chunks)],
+    }
+    return plan, report
+
+async def summarize_sections(article, batched=True):
+    """
+    Summarize the non-empty sections of an article within
+    SUMMARY_ARTICLE_TOKEN_BUDGET; the plan is recorded on the article as
+    `summary_tokens`.
+
+    Each section is first trimmed locally to its highest-information
+    sentences (see `compress_text`), so the prompts carry fewer tokens.
+
+    Oversized sections are first map-reduced: their chunks are summarized
+    concurrently and the partial summaries stand in for the section. Then
+    all sections go out in one structured-output request by default.
+    Articles whose sections together exceed SUMMARY_CONTEXT_BUDGET, or whose
+    batched response cannot be used, fall back to one request per section.
+    """
+    sections = {section: article[section] for section in SECTIONS_TO_SUMMARIZE if article.get(section)}
+    if not sections:
+        return {}
+
+    compressed = await asyncio.gather(*[run_cpu(compress_text, content) for content in sections.values()])
+    original_chars = sum(len(content) for content in sections.values())
+    sections = dict(zip(sections, compressed))
+
+    # Token counting is CPU work on long texts, keep it off the event loop
+    plan, report = await asyncio.to_thread(plan_summary, sections)
+    report["extractive_ratio"] = round(sum(len(content) for content in compressed) / original_chars, 3)
+    article['summary_tokens'] = report
+    if report["dropped_tokens"]:
+        print(
+            f"{article.get('pmc_id')} is over its {report['budget']} token summary budget, "
+            f"dropped {report['dropped_tokens']} of {report['input_tokens']} section tokens."
+        )
+
+    mapped = [(section, len(plan[section])) for section in report["map_reduced"]]
+    partials = await asyncio.gather(*[
+        summarize_chunk(section, text, part, parts)
+        for section, parts in mapped
+        for part, (text, _) in enumerate(plan[section], start=1)
+    ])
+    sections = {}
+    # Planned chunks are already counted; only the short partial summaries still need counting
+    total_tokens = 0
+    for section, chunks in plan.items():
+        if section in report["map_reduced"]:
+            # The final request merges the partial summaries into 2-3 sentences
+            sections[section] = PASSAGE_SEPARATOR.join(partials[:len(chunks)])
+            partials = partials[len(chunks):]
+            total_tokens += count_tokens(sections[section])
+        else:
+            sections[section] = PASSAGE_SEPARATOR.join(text for text, _ in chunks)
+            total_tokens += sum(tokens for _, tokens in chunks)
+    if not sections:
+        return {}
+
+    if batched and total_tokens <= SUMMARY_CONTEXT_BUDGET:
+        try:
+            return await summarize_sections_batched(sections)
+        except (openai.OpenAIError, json.JSONDecodeError, KeyError) as e:
+            print(f"Batched summarization failed for {article.get('pmc_id')}, falling back to per-section calls: {e!r}")
 
-            # Call the synchronous function in a separate thread
-            response = await asyncio.to_thread(
-                client.chat.completions.create,
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a research summarizing assistant who generates concise, formatted summaries."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1100  # Set an appropriate limit for concise summaries
-            )
+    summaries = {}
+    for section, content in sections.items():
+        summaries[section] = await summarize_section(section, content)
+    return summaries
 
-            # Update this line to correctly access the response content
-            summaries[section] = response.choices[0].message.content.strip()
+def summary_token_report(summaries):
+    """Totals of the per-article `summary_tokens` plans."""
+    reports = [summary['summary_tokens'] for summary in summaries if summary.get('summary_tokens')]
+    return {
+        "articles": len(reports),
+        "planned_tokens": sum(report["planned_tokens"] for report in reports),
+        "dropped_tokens": sum(report["dropped_tokens"] for report in reports),
+        "over_budget_articles": sum(1 for report in reports if report["dropped_tokens"]),
+        "map_reduced_sections": sum(len(report["map_reduced"]) for report in reports),
+        "avg_extractive_ratio": (
+            round(sum(report.get("extractive_ratio", 1.0) for report in reports) / len(reports), 3) if reports else 1.0
+        ),
+    }
 
-    return summaries
+# (keyword in section_type, section name), checked in order
+SECTION_KEYWORDS = (
+    ("abstract", "abstract"),
+    ("intro", "introduction"),
+    ("method", "methods"),
+    ("result", "results"),
+    ("discuss", "discussion"),
+    ("concl", "conclusion"),
+)
+
+_ENCODING_FIXES = str.maketrans({'Â': None, 'â': None})  # Fix common encoding issues
+_PUNCTUATION = '.,!?;'
+# Punctuation directly followed by a word character needs a space after it
+_MISSING_SPACE_PATTERN = re.compile(r'([.,!?;])(?=[^\s.,!?;])')
+
+def normalize_section_text(text):
+    """
+    Same cleanup as clean_parsed_sections, run once over a whole section:
+    whitespace is collapsed with split/join (within each passage, keeping
+    the PASSAGE_SEPARATOR between them), spaces before punctuation are
+    dropped with str.replace, and a single regex pass adds the missing
+    spaces after punctuation.
+    """
+    passages = (" ".join(passage.split()) for passage in text.translate(_ENCODING_FIXES).split(PASSAGE_SEPARATOR))
+    text = PASSAGE_SEPARATOR.join(passage for passage in passages if passage)
+    for mark in _PUNCTUATION:
+        text = text.replace(" " + mark, mark)
+    return _MISSING_SPACE_PATTERN.sub(r'\1 ', text)
+
+def classify_section(section_type):
+    section_type = section_type.lower()
+    for keyword, section in SECTION_KEYWORDS:
+        if keyword in section_type:
+            return section
+    return None
 
 def parse_bioc_xml(xml_text):
-    root = ET.fromstring(xml_text)
-    sections = {
-        "abstract": "",
-        "introduction": "",
-        "methods": "",
-        "results": "",
-        "discussion": "",
-        "conclusion": ""
+    """
+    Parse BioC XML into section texts with `iterparse`, clearing each
+    document's passages as soon as they have been read so memory stays flat
+    for large papers. Passages are collected per section and joined and
+    normalized once at the end, with PASSAGE_SEPARATOR between passages.
+    """
+    if isinstance(xml_text, str):
+        xml_text = xml_text.encode("utf-8")
+    passages = {section: [] for _, section in SECTION_KEYWORDS}
+    document = None
+
+    for event, elem in ET.iterparse(io.BytesIO(xml_text), events=("start", "end")):
+        if event == "start":
+            if elem.tag == "document":
+                document = elem
+            continue
+        if elem.tag != "passage":
+            continue
+
+        section_type = elem.find('./infon[@key="section_type"]')
+        passage_text = elem.find('text')
+        if section_type is not None and section_type.text and passage_text is not None:
+            section = classify_section(section_type.text)
+            if section is not None and passage_text.text:
+                passages[section].append(passage_text.text)
+
+        if document is not None:
+            document.clear()
+        else:
+            elem.clear()
+
+    return {section: normalize_section_text(PASSAGE_SEPARATOR.join(parts)) for section, parts in passages.items()}
+
+def preview_sections(parsed_sections):
+    """Lead-sentence and extractive previews of the sections the LLM will summarize."""
+    return {
+        section: preview_summary(parsed_sections[section])
+        for section in SECTIONS_TO_SUMMARIZE
+        if parsed_sections.get(section)
     }
-    
-    for passage in root.findall('.//passage'):
-        section_type = passage.find('./infon[@key="section_type"]')
-        passage_text = passage.find('text')
-        
-        if section_type is not None and passage_text is not None:
-            section_type_text = section_type.text
-            passage_text_content = passage_text.text or ""
-            
-            if "abstract" in section_type_text.lower():
-                sections["abstract"] += clean_parsed_sections(passage_text_content)
-            elif "intro" in section_type_text.lower():
-                sections["introduction"] += clean_parsed_sections(passage_text_content)
-            elif "method" in section_type_text.lower():
-                sections["methods"] += clean_parsed_sections(passage_text_content)
-            elif "result" in section_type_text.lower():
-                sections["results"] += clean_parsed_sections(passage_text_content)
-            elif "discuss" in section_type_text.lower():
-                sections["discussion"] += clean_parsed_sections(passage_text_content)
-            elif "concl" in section_type_text.lower():
-                sections["conclusion"] += clean_parsed_sections(passage_text_content)
-
-    return sections
 
 def calculate_score(metadata):
     score = 0
@@ -188,110 +534,280 @@ def count_filled_sections(parsed_sections):
     total_count = len(parsed_sections)
     return filled_count / total_count if total_count > 0 else 0
 
-async def main(user_input):
+async def report_progress(search_id, stage, **counts):
+    """Record per-stage progress on the search session for the job API; never fails the search."""
+    if search_id is None:
+        return
+    try:
+        await asyncio.to_thread(report_search_progress, search_id, stage, **counts)
+    except Exception as e:
+        print(f"Could not report progress for search {search_id}: {e}")
+
+async def process_articles(client, articles, writer, top_k=TOP_K, lazy=True, wave_size=FETCH_WAVE_SIZE, search_id=None):
+    """
+    Stream scored candidates through full text → parse → summarize, queuing
+    documents on the BatchWriter `writer` as they are ready.
+
+    Articles that already have an LLM summary from an earlier search are
+    neither downloaded nor summarized again; the stored summary is reused.
+    Selected articles are added to the search session `search_id` as soon
+    as they are secured.
+
+    Stages are connected by bounded queues and every article moves on as
+    soon as it is ready. An article is summarized once it is certain to be
+    in the top `top_k` by (filled_sections_count, score), so the first
+    summaries are written while slower downloads are still running.
+
+    Each secured article is first written to `summarized_fields_article` with
+    local preview summaries and `provisional: True`, so the table can render
+    right away; the LLM summary replaces that document in place when ready.
+
+    With `lazy`, candidates are fetched in score order in waves of
+    `wave_size`, and fetching stops as soon as the remaining candidates can
+    no longer change the top `top_k`. Otherwise every candidate is fetched.
+    Returns the summarized articles in ranking order.
+    """
+    parse_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    fetch_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    summarize_queue = asyncio.Queue()
+    selector = TopKSelector(articles, top_k)
+    progress = asyncio.Condition()
+    previews = {}
+    full_texts = {}
+    summaries = []
+    counts = {"candidates": len(articles), "processed": 0, "selected": 0, "reused": 0, "summarized": 0}
+    try:
+        known = await asyncio.to_thread(find_final_summaries, [article['pmc_id'] for article in articles])
+    except Exception as e:
+        print(f"Could not look up existing summaries: {e}")
+        known = {}
+
+    async def feed_waves():
+        for i in range(0, len(articles), wave_size):
+            if selector.complete:
+                break
+            wave = articles[i:i + wave_size]
+            for article in wave:
+                await fetch_queue.put(article)
+            # Wait until this wave has been fetched and parsed before deciding whether another is needed
+            async with progress:
+                await progress.wait_for(
+                    lambda: selector.complete or not any(id(article) in selector.pending for article in wave)
+                )
+        skipped = sum(1 for article in articles if id(article) in selector.pending)
+        if skipped:
+            print(f"Top {top_k} secured; skipped fetching {skipped} lower-ranked candidates.")
+        await fetch_queue.put(DONE)
+
+    async def select(released):
+        # Called once for every candidate that is fetched and parsed, or dropped
+        async with progress:
+            progress.notify_all()
+        counts["processed"] += 1
+        counts["selected"] += len(released)
+        counts["reused"] += sum(1 for article in released if article['pmc_id'] in known)
+        await report_progress(search_id, "articles", **counts)
+        if search_id and released:
+            # The selector has already kept these articles; a failed session update must not lose them
+            try:
+                await asyncio.to_thread(add_session_articles, search_id, [article['pmc_id'] for article in released])
+            except Exception as e:
+                print(f"Could not add articles to search {search_id}: {e}")
+        for article in released:
+            if article['pmc_id'] in known:
+                # Summarized by an earlier search; only the recency score has moved on
+                reused = dict(known[article['pmc_id']], score=article['score'])
+                summaries.append(reused)
+                continue
+            # The raw document only references its sections, which go to the compressed full-text store
+            full_text = full_texts.pop(id(article))
+            await writer.add(FULL_TEXT_COLLECTION, full_text)
+            await writer.add('raw_fields_article', slim_article(article, full_text))
+            provisional = {key: value for key, value in article.items() if key != '_id'}
+            provisional.update(previews.pop(id(article), {}))
+            provisional['provisional'] = True
+            # Previews and the LLM summaries that replace them share one document per article
+            await writer.add('summarized_fields_article', provisional)
+            await summarize_queue.put(article)
+
+    async def fetch(article):
+        if selector.complete:
+            return
+        if article['pmc_id'] in known:
+            article['filled_sections_count'] = known[article['pmc_id']].get('filled_sections_count', 0)
+            await select(selector.add(article))
+            return
+        # A successful download doubles as the availability check
+        try:
+            full_text = await fetch_full_text(client, article['pmc_id'])
+        except Exception as e:
+            print(f"Error fetching full text for {article['pmc_id']}: {e!r}")
+            full_text = None
+        if full_text:
+            await parse_queue.put((article, full_text))
+        else:
+            await select(selector.discard(article))
+
+    async def parse(item):
+        article, full_text = item
+        parsed_sections = await run_cpu(parse_bioc_xml, full_text)
+        previews[id(article)], full_texts[id(article)] = await asyncio.gather(
+            run_cpu(preview_sections, parsed_sections),
+            run_cpu(full_text_document, article['pmc_id'], parsed_sections),
+        )
+        article.update(parsed_sections)
+        article['filled_sections_count'] = count_filled_sections(parsed_sections)
+        article["article_url"] = f"https://www.ncbi.nlm.nih.gov/pmc/articles/{article['pmc_id']}/"
+        await select(selector.add(article))
+
+    def discard_on_error(handler):
+        """
+        Drop the item's article from the selection if `handler` fails before
+        settling it; feed_waves waits for every article of a wave to leave
+        `selector.pending`, so an unsettled one would stall the search.
+        """
+        async def settle(item):
+            article = item[0] if isinstance(item, tuple) else item
+            try:
+                await handler(item)
+            except Exception as e:
+                print(f"Dropping {article['pmc_id']} after {handler.__name__} failed: {e!r}")
+                previews.pop(id(article), None)
+                full_texts.pop(id(article), None)
+                if id(article) in selector.pending:
+                    await select(selector.discard(article))
+        settle.__name__ = handler.__name__
+        return settle
+
+    async def summarize(article):
+        summary = await summarize_sections(article)
+        summarized = {key: value for key, value in article.items() if key != '_id'}
+        summarized.update(summary)
+        summarized['provisional'] = False
+        summaries.append(summarized)
+        counts["summarized"] += 1
+        await report_progress(search_id, "articles", **counts)
+        await writer.add('summarized_fields_article', summarized)
+
+    await asyncio.gather(
+        feed_waves() if lazy else feed(articles, fetch_queue),
+        stage(fetch_queue, discard_on_error(fetch), workers=FETCH_WORKERS, outbox=parse_queue),
+        stage(parse_queue, discard_on_error(parse), workers=SCRAPER_POOL_WORKERS, outbox=summarize_queue),
+        stage(summarize_queue, summarize, workers=top_k),
+    )
+
+    reused = sum(1 for summary in summaries if summary['pmc_id'] in known)
+    if reused:
+        print(f"Reused {reused} stored summaries from earlier searches.")
+    # Summaries arrive in completion order; ties fall back to the candidates' original order, as in the selector
+    rank = {article['pmc_id']: i for i, article in enumerate(articles)}
+    summaries.sort(key=lambda x: (x['filled_sections_count'], x['score'], -rank[x['pmc_id']]), reverse=True)
+    return summaries
+
+async def main(user_input, top_k=TOP_K, retmax=SEARCH_RETMAX, search_id=None):
+    """Run one search as session `search_id` (a new one if not given) and return its ID."""
+    search_id = search_id or new_search_id()
+    status, summaries, error = "failed", None, None
+    try:
+        summaries = await search_and_summarize(user_input, top_k=top_k, retmax=retmax, search_id=search_id)
+        status = "done"
+    except Exception as e:
+        error = repr(e)
+        raise
+    finally:
+        try:
+            pmc_ids = [summary['pmc_id'] for summary in summaries] if summaries is not None else None
+            await asyncio.to_thread(finish_search_session, search_id, status, pmc_ids, error)
+        except Exception as e:
+            print(f"Could not update search session {search_id}: {e}")
+        # The pooled OpenAI client belongs to this event loop, which asyncio.run closes next
+        await close_async_client()
+    return search_id
+
+async def search_and_summarize(user_input, top_k=TOP_K, retmax=SEARCH_RETMAX, search_id=None):
+    """Search, summarize and analyse gaps for `user_input`; returns the summaries in ranking order."""
     start_time = time.time()  # Start timer for the entire script
+    summaries = []
     # user_input = "microbiome"
     search_query = user_input + " [Title/Abstract] AND open access[filter]"
 
-    timeout = aiohttp.ClientTimeout(total=60)  # Extend timeout to 60 seconds
-    
-    async with aiohttp.ClientSession(timeout=timeout) as session:
+    # One shared client so every NCBI request goes through the same rate limiter,
+    # and one writer batching every MongoDB write of the run
+    async with NCBIClient(api_key=NCBI_API_KEY, cache=get_response_cache()) as ncbi, BatchWriter() as writer:
+        try:
+            await asyncio.to_thread(ensure_indexes)
+            if search_id:
+                await asyncio.to_thread(create_search_session, user_input, search_id)
+        except Exception as e:
+            print(f"Could not prepare MongoDB for the search: {e}")
         # Step 1: Search for articles
-        search_results = await search_open_access_articles(session, search_query, retmax=20)
+        search_results = await search_open_access_articles(ncbi, search_query, retmax=retmax)
 
         if search_results:
             tree = ET.fromstring(search_results)
             id_list = tree.findall('.//Id')
             pmc_ids = [f"PMC{id_elem.text}" for id_elem in id_list]
+            await report_progress(search_id, "search", found=len(pmc_ids))
+
+            # Step 2: Gather metadata in batches of comma-joined IDs
+            metadata_results = await fetch_metadata_in_batches(ncbi, pmc_ids)
 
-            articles = []
-
-            # Step 2: Gather metadata and check for full text availability
-            tasks = [fetch_article_metadata(session, pmc_id) for pmc_id in pmc_ids]
-            metadata_results = await asyncio.gather(*tasks)
-
-            for pmc_id, metadata_xml in zip(pmc_ids, metadata_results):
-                if metadata_xml:
-                    metadata = parse_metadata(metadata_xml)
-                    metadata['pmc_id'] = pmc_id
-                    articles.append(metadata)
-
-            # Step 3: Check full text availability concurrently
-            available_articles = []
-            tasks = [check_full_text_availability(session, article['pmc_id']) for article in articles]
-            availability_results = await asyncio.gather(*tasks)
-
-            for article, is_available in zip(articles, availability_results):
-                if is_available:
-                    article['score'] = calculate_score(article)
-                    available_articles.append(article)
-
-            # Step 4: Sort articles by score (higher is better)
-            available_articles.sort(key=lambda x: x['score'], reverse=True)
-
-            # Step : Fetch and parse full text for available articles concurrently
-            parsed_articles = []
-            tasks = [fetch_full_text(session, article['pmc_id']) for article in available_articles]
-            full_text_results = await asyncio.gather(*tasks)
-
-            for article, full_text in zip(available_articles, full_text_results):
-                if full_text:
-                    try:
-                        parsed_sections = parse_bioc_xml(full_text)
-                        filled_sections_count = count_filled_sections(parsed_sections)
-                        article.update(parsed_sections)
-                        article['filled_sections_count'] = filled_sections_count
-                        article["article_url"] = f"https://www.ncbi.nlm.nih.gov/pmc/articles/{article['pmc_id']}/"
-                        parsed_articles.append(article)
-                    except Exception as e:
-                        print(f"Error parsing full text for {article['pmc_id']}: {e}")
-
-            # Step 6: Save only the top 5 parsed articles to MongoDB
-            parsed_articles.sort(key=lambda x: (x['filled_sections_count'], x['score']), reverse=True)
-            top_5_articles = parsed_articles[:5]  # Get only the top 5 articles
-            save_to_mongodb(top_5_articles, 'raw_fields_article')
-
-            # Step 7: Summarize relevant sections and save to a new collection
-            summaries = []
-            tasks = [summarize_sections(article) for article in top_5_articles]
-            summary_results = await asyncio.gather(*tasks)
-
-            for article, summary in zip(top_5_articles, summary_results):
-                article.update(summary)  # Add summaries to the article
-                summaries.append(article)
-
-            save_to_mongodb(summaries, 'summarized_fields_article')
-
-            # Step 8: Perform gap analysis
+            metadata_by_id = {}
+            parsed_batches = await asyncio.gather(
+                *[run_cpu(parse_metadata_batch, metadata_xml) for metadata_xml in metadata_results if metadata_xml]
+            )
+            for parsed_batch in parsed_batches:
+                metadata_by_id.update(parsed_batch)
+            articles = [metadata_by_id[pmc_id] for pmc_id in pmc_ids if pmc_id in metadata_by_id]
+
+            # Step 3: Score and sort articles (higher is better)
+            for article in articles:
+                article['score'] = calculate_score(article)
+            articles.sort(key=lambda x: x['score'], reverse=True)
+            await report_progress(search_id, "metadata", articles=len(articles))
+
+            # Steps 4-6: Fetch, parse, summarize and save the top articles as a streaming pipeline
+            summaries = await process_articles(ncbi, articles, writer, top_k=top_k, search_id=search_id)
+
+            # Step 7: Perform gap analysis
+            await report_progress(search_id, "gap_analysis", articles=len(summaries))
             gaps = await perform_gap_analysis(summaries, user_input)
             
             if gaps and isinstance(gaps, dict) and 'analysis' in gaps and gaps['analysis']:
                 if isinstance(gaps['analysis'], list) and len(gaps['analysis']) > 0:
                     for gap in gaps['analysis']:
-                        try:
-                            await save_to_mongodb([gap], 'gap_individual_articles')
-                        except Exception as e:
-                            print(f"Error saving gap analysis: {e}")
+                        gap['search_id'] = search_id
+                        gap['search_query'] = user_input
+                        await writer.add('gap_individual_articles', gap)
 
                 # Handle comparison section
                 if 'comparison_section' in gaps and gaps['comparison_section']:
                     # Check if the comparison section is a dictionary
-                    comparison_data = {
-                        'commonalities': gaps['comparison_section'].get('commonalities', []),
-                        'contrasts': gaps['comparison_section'].get('contrasts', []),
-                        'emerging_trends': gaps['comparison_section'].get('emerging_trends', [])
-                    }
-                    try:
-                        await save_to_mongodb([comparison_data], 'gap_comparison_section')  # Wrap in list
-                    except Exception as e:
-                        print(f"Error saving comparison section item: {e}")
+                    if isinstance(gaps['comparison_section'], dict):
+                        comparison_data = {
+                            'commonalities': gaps['comparison_section'].get('commonalities', []),
+                            'contrasts': gaps['comparison_section'].get('contrasts', []),
+                            'emerging_trends': gaps['comparison_section'].get('emerging_trends', []),
+                            'search_id': search_id,
+                            'search_query': user_input
+                        }
+                        await writer.add('gap_comparison_section', comparison_data)
                     else:
                         print("Comparison section is not a dictionary.")
             else:
                 print("No valid gaps to save.")
 
+            await writer.flush()
             end_time = time.time()  # End timer for the entire script
             print(f"\nTotal time taken for the script to run: {end_time - start_time:.2f} seconds")
+            print(f"NCBI request stats: {ncbi.stats}")
+            print(f"NCBI cache stats: {ncbi.cache.stats}")
+            print(f"OpenAI governor stats: {governor.stats()}")
+            print(f"LLM cache stats: {get_llm_cache().stats()}")
+            print(f"MongoDB batch writer stats: {writer.stats}")
+            print(f"Summary token budget: {summary_token_report(summaries)}")
+
+    return summaries
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
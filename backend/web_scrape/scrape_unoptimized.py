@@ -3,8 +3,12 @@ import xml.etree.ElementTree as ET
 import re
 from datetime import datetime
 import time
+import os
+import sys
 
-from mongo_utils import save_to_mongodb
+# mongo_utils uses package-relative imports, so import it through the web_scrape package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from web_scrape.mongo_utils import save_to_mongodb
 
 def clean_parsed_sections(text):
     text = text.replace('Â', '').replace('â', '').replace('â\x80\x93', '-')  # Fix common encoding issues
@@ -3,64 +3,31 @@ import requests
 import json
 import time
 from dotenv import load_dotenv
-import pymongo
 import os
 from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
 import pandas as pd
 
 load_dotenv()
 
+# How often the table is refreshed while a search is running
+POLL_INTERVAL_SECONDS = 2
+# Give up on a search after this long, or after this many failed status reads in a row
+POLL_TIMEOUT_SECONDS = 15 * 60
+MAX_POLL_ERRORS = 5
+# Timeout for each request to the backend; the job API answers without waiting for the search
+REQUEST_TIMEOUT_SECONDS = 10
+
 # Streamlit configuration for minimalistic appearance
 st.set_page_config(page_title="Search App", layout="centered")
 
 
-def fetch_data_from_mongodb_pubmed():
-    client = pymongo.MongoClient(os.getenv("MONGO_URI"))
-
-    db = client["research_articles"]
-    collection = db["summarized_fields_article"]
-
-    # Retrieve all documents from the collection
-    papers = collection.find()
-    return papers, client
-
-
-# Function to truncate text
-def truncate_text(text, max_words=50):
-    if text is None or text == "":
-        return "N/A"
-    words = text.split()
-    if len(words) > max_words:
-        return " ".join(words[:max_words]) + "..."
-    return text
-
-
-# Function to create a multiselect string from a list
-def format_list(options: list) -> str:
-    if not options or len(options) == 1:
-        return "N/A"
-    return " | ".join(str(option) for option in options)
-
-
-# Function to format references
-def format_reference(options: list) -> str:
-    if not options or len(options) == 1:
-        return "N/A"
-
-    formatted_references = []
-    index = 1
-    for option in options:
-        if isinstance(option, dict):
-            authors = option.get("authors", "N/A")
-            title = option.get("title", "N/A")
-            journal = option.get("journal_name", "N/A")
-            year = option.get("publication_date", "N/A").split()[-1]  # Extract year
-
-            reference = f"{index}. {authors} ({year}). {title}. {journal}. \n"
-            formatted_references.append(reference)
-            index += 1
-
-    return "\n".join(formatted_references)
+def fetch_data_from_backend_pubmed(search_id, page=0):
+    # One page of the articles selected by this search, as their precomputed display fields
+    response = requests.get(
+        job_status_url(search_id) + "/articles", params={"page": page}, timeout=REQUEST_TIMEOUT_SECONDS
+    )
+    response.raise_for_status()
+    return response.json()
 
 
 # Function to load JSON files from a directory
@@ -117,32 +84,10 @@ def json_to_text(papers):
 
 
 # Main functions
-def load_database_pubmed():
-    papers, client = fetch_data_from_mongodb_pubmed()
-    prompt = process_md("./frontend/src/assets/keyword-generation-prompt.md")
-    # Process all files
-    all_data = []
-    for data in papers:
-        display_data = {
-            "Link": data.get("article_url", "N/A"),
-            "PMC ID": data.get("pmc_id", "N/A"),
-            "Title": data.get("title", "N/A"),
-            "Abstract": truncate_text(data.get("abstract", "N/A")),
-            "Authors": format_list(data.get("authors", [])),
-            "Publication Date": data.get("publication_date", "N/A"),
-            "Journal Name": data.get("journal_name", "N/A"),
-            "DOI": data.get("doi", "N/A"),
-            "Introduction": truncate_text(data.get("introduction", "N/A")),
-            "Methods": truncate_text(data.get("methods", "N/A")),
-            "Results": truncate_text(data.get("results", "N/A")),
-            "Discussion": truncate_text(data.get("discussion", "N/A")),
-            "Conclusion": truncate_text(data.get("conclusion", "N/A")),
-        }
-
-        all_data.append(display_data)
-
-    client.close()
-    return all_data
+def load_database_pubmed(search_id, page=0):
+    # Rows come ready for the table, so no per-row formatting here. Returns (rows, total, page size)
+    data = fetch_data_from_backend_pubmed(search_id, page)
+    return data["articles"], data["total"], data["page_size"]
 
 def load_table(all_data):
     display_df = pd.DataFrame(all_data)
@@ -174,27 +119,15 @@ def load_table(all_data):
     )
 
 
-# Function to fetch individual articles gaps from MongoDB
-def fetch_individual_articles_gaps():
-    client = pymongo.MongoClient(os.getenv("MONGO_URI"))
-    db = client["research_articles"]
-    collection = db["gap_individual_articles"]
-
-    # Retrieve all documents from the collection
-    gaps = list(collection.find())
-    client.close()
-    return gaps
-
-# Function to fetch papers comparison gaps from MongoDB
-def fetch_papers_comparison_gaps():
-    client = pymongo.MongoClient(os.getenv("MONGO_URI"))
-    db = client["research_articles"]
-    collection = db["gap_comparison_section"]
-
-    # Retrieve all documents from the collection
-    gaps = list(collection.find())
-    client.close()
-    return gaps
+# Function to fetch this search's individual article and paper comparison gaps
+def fetch_gaps(search_id):
+    try:
+        response = requests.get(job_status_url(search_id) + "/gaps", timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        return response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        st.error(f"Could not load the gap analysis: {e}")
+        return {"gaps": [], "comparison": []}
 
 # Optional: Add a title before the table
 st.title("🔍 Search")
@@ -206,21 +139,29 @@ BACKEND_URL = "https://aira-77ad510980a9.herokuapp.com/web_search"
 search_query = st.text_input("Enter your search query", "")
 
 
-def main():
+def main(search_id):
     message_placeholder = st.empty()
     message_placeholder.success("Fetching articles and summarizing them...")
     st.subheader("Top Research Articles by Recency")
-    all_data = load_database_pubmed()
+    # The page picker below sets search_page and reruns the script
+    try:
+        all_data, total, page_size = load_database_pubmed(search_id, st.session_state.get("search_page", 1) - 1)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        message_placeholder.error(f"Could not load the articles: {e}")
+        return
     message_placeholder.success("Fetch successful!")
     load_table(all_data)
     message_placeholder.empty()
+    if total > page_size:
+        st.number_input("Page", min_value=1, max_value=-(-total // page_size), key="search_page")
 
     st.markdown("---")
 
     # Papers comparison gap analysis
     st.subheader("Papers Comparison Gap Analysis")
     print()
-    comparison_gaps = fetch_papers_comparison_gaps()
+    gaps = fetch_gaps(search_id)
+    comparison_gaps = gaps["comparison"]
 
     if comparison_gaps:
         # Loop through each gap and display it in a more narrative format
@@ -257,7 +198,7 @@ def main():
 
     # Individual paper gap analysis
     st.subheader("Individual Paper Gap Analysis")
-    individual_gaps = fetch_individual_articles_gaps()
+    individual_gaps = gaps["gaps"]
     if individual_gaps:
         # Create a DataFrame from the individual gaps data
         display_df_individual = pd.DataFrame(individual_gaps)
@@ -275,26 +216,88 @@ def main():
     else:
         st.warning("No gaps found for individual papers.")
 
+def job_status_url(search_id):
+    # Job endpoints live next to /web_search on the backend
+    return BACKEND_URL.rsplit("/", 1)[0] + f"/jobs/{search_id}"
+
+
+def read_job_status(search_id):
+    """The job's status document, or an error message; 404 means the backend no longer knows the job."""
+    response = requests.get(job_status_url(search_id), timeout=REQUEST_TIMEOUT_SECONDS)
+    if response.status_code == 404:
+        return {"status": "failed", "error": "The search job is unknown to the backend (it may have restarted)."}
+    response.raise_for_status()
+    return response.json()
+
+
+def describe_progress(job):
+    stage = job.get("stage") or job.get("status")
+    counts = job.get("progress", {}).get(stage, {})
+    details = ", ".join(f"{name} {count}" for name, count in counts.items())
+    return f"{stage.replace('_', ' ').capitalize()}" + (f": {details}" if details else "")
+
+
 # Search button to trigger the API request
 if st.button("Search"):
     if search_query:
-        with st.spinner("Loading... Please wait."):
-            try:
-                # Sending request to the backend API
-                print(f"Sending query: {search_query}")
-                response = requests.post(
-                    BACKEND_URL, json={"query": search_query}
-                )
-
-                # Check for the response status
-                if response.status_code == 200:
-                    st.success("Search completed successfully.")
-                    main()
-                else:
-                    st.error(f"Error: {response.status_code} - {response.text}")
-
-            except requests.exceptions.RequestException as e:
-                st.error(f"Error while contacting backend: {str(e)}")
+        # Sending request to the backend API, which queues the search and answers straight away
+        print(f"Sending query: {search_query}")
+        st.session_state["search_page"] = 1
+        try:
+            response = requests.post(BACKEND_URL, json={"query": search_query}, timeout=REQUEST_TIMEOUT_SECONDS)
+        except requests.exceptions.RequestException as e:
+            response = None
+            st.error(f"Error while contacting backend: {str(e)}")
+
+        if response is not None and response.status_code != 202:
+            st.error(f"Error: {response.status_code} - {response.text}")
+        elif response is not None:
+            # The backend picks the search ID, or hands back that of the matching search already running
+            search_id = response.json()["search_id"]
+            st.session_state["search_id"] = search_id
+            status_placeholder = st.empty()
+            table_placeholder = st.empty()
+            job = {}
+            errors = 0
+            deadline = time.monotonic() + POLL_TIMEOUT_SECONDS
+            with st.spinner("Loading... Please wait."):
+                # Poll the job until it finishes, refreshing the table meanwhile
+                while job.get("status") not in ("done", "failed"):
+                    try:
+                        job = read_job_status(search_id)
+                        errors = 0
+                    except (requests.exceptions.RequestException, ValueError) as e:
+                        errors += 1
+                        print(f"Could not read job status: {e}")
+                        if errors >= MAX_POLL_ERRORS:
+                            job = {"status": "failed", "error": f"Lost contact with the backend: {e}"}
+                    if job.get("status") not in ("done", "failed") and time.monotonic() > deadline:
+                        job = {"status": "failed", "error": "The search did not finish in time."}
+                    if job.get("status"):
+                        status_placeholder.info(describe_progress(job))
+                    try:
+                        all_data, _, _ = load_database_pubmed(search_id)
+                    except (requests.exceptions.RequestException, ValueError) as e:
+                        print(f"Could not refresh the table: {e}")
+                        all_data = []
+                    if all_data:
+                        with table_placeholder.container():
+                            st.subheader("Top Research Articles by Recency")
+                            st.caption("Preview summaries are replaced as the full summaries finish.")
+                            load_table(all_data)
+                    if job.get("status") not in ("done", "failed"):
+                        time.sleep(POLL_INTERVAL_SECONDS)
+            status_placeholder.empty()
+            table_placeholder.empty()
+
+            if job["status"] == "done":
+                st.success("Search completed successfully.")
+                main(search_id)
+            else:
+                st.error(f"Search failed: {job.get('error') or 'unknown error'}")
 
     else:
-        st.warning("Please enter a search query")
\ No newline at end of file
+        st.warning("Please enter a search query")
+# Keep showing the last search when the page reruns (e.g. when another table page is picked)
+elif "search_id" in st.session_state:
+    main(st.session_state["search_id"])
\ No newline at end of file
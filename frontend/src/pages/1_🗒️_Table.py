@@ -3,61 +3,22 @@ import json
 import pandas as pd
 import os
 from st_aggrid import AgGrid, GridOptionsBuilder
-import pymongo
 import re
 import ast
+import requests
 from dotenv import load_dotenv
 
 load_dotenv()
 
+PAPERS_URL = "https://aira-77ad510980a9.herokuapp.com/papers"
+REQUEST_TIMEOUT_SECONDS = 10
 
-def fetch_data_from_mongodb_pdf():
-    client = pymongo.MongoClient(os.getenv("MONGO_URI"))
 
-    db = client["research_articles"]
-    collection = db["pdf_upload_papers"]
-
-    # Retrieve all documents from the collection
-    papers = collection.find()
-    return papers, client
-
-
-# Function to truncate text
-def truncate_text(text, max_words=50):
-    if text is None or text == "":
-        return "N/A"
-    words = text.split()
-    if len(words) > max_words:
-        return " ".join(words[:max_words]) + "..."
-    return text
-
-
-# Function to create a multiselect string from a list
-def format_list(options: list) -> str:
-    if not options or len(options) == 1:
-        return "N/A"
-    return " | ".join(str(option) for option in options)
-
-
-# Function to format references
-def format_reference(options: list) -> str:
-    if not options or len(options) == 1:
-        return "N/A"
-
-    formatted_references = []
-    index = 1
-    for option in options:
-        if isinstance(option, dict):
-            authors = option.get("authors", "N/A")
-            title = option.get("title", "N/A")
-            journal = option.get("journal_name", "N/A")
-            year = option.get("publication_date", "N/A").split()[-1]  # Extract year
-
-            reference = f"{index}. {authors} ({year}). {title}. {journal}. \n"
-            formatted_references.append(reference)
-            index += 1
-
-    return "\n".join(formatted_references)
+def fetch_data_from_backend_pdf(page=0):
+    # One page of precomputed display rows, newest uploads first
+    response = requests.get(PAPERS_URL, params={"page": page}, timeout=REQUEST_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return response.json()
 
 
 # Function to load JSON files from a directory
@@ -110,33 +71,10 @@ def process_keywords_output(llm_output):
 
 
 # Main function
-def load_database_pdf():
-    papers, client = fetch_data_from_mongodb_pdf()
-
-    # Process all files
-    all_data = []
-    for data in papers:
-        display_data = {
-            "Title": data.get("title", "N/A"),
-            "Abstract": truncate_text(data.get("abstract", "N/A")),
-            "Authors": format_list(data.get("authors", [])),
-            "Publication Date": data.get("publication_date", "N/A"),
-            "Journal Name": data.get("journal_name", "N/A"),
-            "DOI": data.get("doi", "N/A"),
-            "Keywords": format_list(data.get("keywords", [])),
-            "Introduction": truncate_text(data.get("introduction", "N/A")),
-            "Methods": truncate_text(data.get("methods", "N/A")),
-            "Results": truncate_text(data.get("results", "N/A")),
-            "Discussion": truncate_text(data.get("discussion", "N/A")),
-            "Conclusion": truncate_text(data.get("conclusion", "N/A")),
-            "References": truncate_text(
-                format_reference(data.get("references", [])), max_words=100
-            ),
-        }
-        all_data.append(display_data)
-
-    client.close()
-    return all_data
+def load_database_pdf(page=0):
+    # Returns (rows, total, page size)
+    data = fetch_data_from_backend_pdf(page)
+    return data["papers"], data["total"], data["page_size"]
 
 
 def load_table(all_data, type):
@@ -171,8 +109,15 @@ def load_table(all_data, type):
 # Main application function
 def main():
     st.title("Knowledge Base")
-    data = load_database_pdf()
+    # The page picker below sets pdf_page and reruns the script
+    try:
+        data, total, page_size = load_database_pdf(st.session_state.get("pdf_page", 1) - 1)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        st.error(f"Could not load the uploaded papers: {e}")
+        return
     load_table(data, "pdf")
+    if total > page_size:
+        st.number_input("Page", min_value=1, max_value=-(-total // page_size), key="pdf_page")
 
 
 main()
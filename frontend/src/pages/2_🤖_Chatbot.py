@@ -1,7 +1,14 @@
 import os
+import sys
 import streamlit as st
 import requests  # Import the requests library
 
+# The SSE client is shared with the Upload page
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from sse_client import stream_tokens
+
+STREAM_URL = "https://aira-77ad510980a9.herokuapp.com/api/get_response/stream"
+
 
 # Main function to initialize the app
 def main():
@@ -47,22 +54,18 @@ def display_user_message(prompt):
 # Function to generate and display assistant response using Flask
 def generate_assistant_response(user_input):
     with st.chat_message("assistant"):
-        # Call the Flask API
-        response = requests.post(
-            "https://aira-77ad510980a9.herokuapp.com/api/get_response", json={"user_input": user_input}
-        )
-
-        if response.status_code == 200:
-            response_data = response.json()
-            assistant_response = response_data.get("response")
-
-            # Add assistant response to the session state (chat history)
-            st.session_state.messages.append(
-                {"role": "assistant", "content": assistant_response}
-            )
-            st.markdown(assistant_response)  # Display the assistant's response
-        else:
+        # Tokens are rendered as the model writes them instead of after the whole answer
+        try:
+            assistant_response = st.write_stream(stream_tokens(STREAM_URL, {"user_input": user_input}))
+        except (requests.exceptions.RequestException, RuntimeError) as e:
+            print(f"Streaming response failed: {e}")
             st.markdown("Error: Unable to get response from the server.")
+            return
+
+        # Add assistant response to the session state (chat history)
+        st.session_state.messages.append(
+            {"role": "assistant", "content": assistant_response}
+        )
 
 
 # Run the app
@@ -1,99 +1,42 @@
 import os
-from neo4j import GraphDatabase
 # from pyvis.network import Network
 import streamlit.components.v1 as components
 import streamlit as st
 import json
+import requests
 from typing import Dict, Any
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Connect to Neo4j
-neo4j_uri = os.getenv("NEO4J_URI")
-neo4j_username = os.getenv("NEO4J_USERNAME")
-neo4j_password = os.getenv("NEO4J_PASSWORD")
-# driver = GraphDatabase.driver(uri, auth=(username, password))
-
-class Neo4jConnection:
-    def __init__(self, uri: str, user: str, password: str):
-        """
-        Initializes the Neo4j connection.
-
-        Args:
-            uri (str): The URI for the Neo4j instance.
-            user (str): Username for authentication.
-            password (str): Password for authentication.
-        """
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
-    
-    def close(self):
-        """
-        Closes the Neo4j driver connection.
-        """
-        self.driver.close()
-    
-    def fetch_graph_data(self, cypher: str = "MATCH (s)-[r:!MENTIONS]->(t) RETURN s,r,t LIMIT 500") -> Dict[str, Any]:
-        """
-        Fetches nodes and relationships from the Neo4j graph database based on the provided Cypher query.
-
-        Args:
-            cypher (str): The Cypher query to execute.
-
-        Returns:
-            dict: A dictionary containing 'nodes' and 'links' for graph visualization.
-        """
-        with self.driver.session() as session:
-            result = session.run(cypher)
-            nodes = {}
-            edges = []
-            for record in result:
-                source_node = record['s']
-                relationship = record['r']
-                target_node = record['t']
-                
-                # Process Source Node
-                if source_node.id not in nodes:
-                    nodes[source_node.id] = {
-                        'id': source_node['id'],
-                        'label': source_node['id'],
-                        # 'group': list(source_node.labels)[0] if source_node.labels else 'Default',
-                        'description': source_node['labels'],
-                        # 'properties': dict(source_node)
-                    }
-                
-                # Process Target Node
-                if target_node.id not in nodes:
-                    nodes[target_node.id] = {
-                        'id': target_node['id'],
-                        'label': target_node['id'],
-                        # 'group': list(target_node.labels)[0] if target_node.labels else 'Default',
-                        'description': target_node['labels'],
-                        # 'properties': dict(target_node)
-                    }
-                
-                # Process Relationship
-                edges.append({
-                    'source': source_node['id'],
-                    'target': target_node['id'],
-                    'type': relationship.type,
-                    # 'properties': dict(relationship)  # Include relationship properties if needed
-                })
-            
-            return {'nodes': list(nodes.values()), 'links': edges}
-            
+KNOWLEDGE_GRAPH_URL = "https://aira-77ad510980a9.herokuapp.com/knowledge_graph"
+REQUEST_TIMEOUT_SECONDS = 30
+
+def fetch_graph_data() -> Dict[str, Any]:
+    """
+    Fetches the knowledge graph's nodes and relationships from the backend.
+
+    Returns:
+        dict: A dictionary containing 'nodes' and 'links' for graph visualization.
+    """
+    response = requests.get(KNOWLEDGE_GRAPH_URL, timeout=REQUEST_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return response.json()
+
 def prepare_data_for_d3(graph_data):
     # graph_data is a dictionary with 'nodes' and 'links'
     return json.dumps(graph_data)
 
-conn = Neo4jConnection(neo4j_uri, neo4j_username, neo4j_password)
-
 def main():
     st.set_page_config(layout="wide")
     st.title("AI Research Knowledge Graph Visualization with D3.js")
 
-    # Fetch data from Neo4j
-    graph_data = conn.fetch_graph_data()  # Adjust limit as needed
+    # Fetch data from Neo4j, through the backend
+    try:
+        graph_data = fetch_graph_data()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        st.error(f"Could not load the knowledge graph: {e}")
+        return
     # graph_data = conn.fetchGraphData(uri, username, password)
     # print(graph_data)
     # Prepare data for D3.js
@@ -121,8 +64,6 @@ def main():
         # Implement search/filter logic if needed
         st.write(f"Search functionality can be implemented here for: {search_term}")
 
-    conn.close()
-
 if __name__ == "__main__":
     main()
 
@@ -3,13 +3,23 @@ import os
 import streamlit as st
 import PyPDF2
 import io
-import pymongo
 from openai import OpenAI
 import requests
+import sys
 from dotenv import load_dotenv
 
+# The SSE client is shared with the Chatbot page
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from sse_client import stream_tokens
+
 load_dotenv()
 
+CODE_STREAM_URL = "https://aira-77ad510980a9.herokuapp.com/api/generate_code/stream"
+PAPERS_URL = "https://aira-77ad510980a9.herokuapp.com/papers"
+REQUEST_TIMEOUT_SECONDS = 30
+# Paper summaries kept in memory across reruns and sessions
+PAPER_SUMMARY_CACHE_ENTRIES = 100
+
 # Set page config to change the name in the sidebar
 st.set_page_config(
     page_title="PDF Analyzer",  # This will appear in the sidebar and browser tab
@@ -25,15 +35,17 @@ st.sidebar.write("Welcome to the PDF Analyzer tool!")
 st.sidebar.write("Upload a PDF file to get started.")
 
 
-# Get paper summary from openai model
-def get_paper_summary(prompt, text):
+# Streamlit reruns this page on every interaction; re-uploads of the same PDF come from the cache.
+# Failed calls raise, so they are not cached
+@st.cache_data(show_spinner=False, max_entries=PAPER_SUMMARY_CACHE_ENTRIES)
+def request_paper_summary(prompt, text):
+    # Call the OpenAI API with GPT-4
+    userPrompt = (
+        "Below is the paper, please fill in and return the JSON structure, and only output the JSON structure and no additional text. Remove ``` from the beginning and end of the JSON structure."
+        + text
+    )
     client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     try:
-        # Call the OpenAI API with GPT-4
-        userPrompt = (
-            "Below is the paper, please fill in and return the JSON structure, and only output the JSON structure and no additional text. Remove ``` from the beginning and end of the JSON structure."
-            + text
-        )
         response = client.chat.completions.create(
             model="gpt-4o-mini",  # Specify GPT-4 model
             messages=[
@@ -41,11 +53,17 @@ def get_paper_summary(prompt, text):
                 {"role": "user", "content": userPrompt},
             ],
         )
-
-        # Extract and return the response text
+    finally:
         client.close()
-        return response.choices[0].message.content
 
+    # Extract and return the response text
+    return response.choices[0].message.content
+
+
+# Get paper summary from openai model
+def get_paper_summary(prompt, text):
+    try:
+        return request_paper_summary(prompt, text)
     except Exception as e:
         print(f"Error occurred: {e}")
         return None
@@ -109,15 +127,10 @@ def push_data_to_mongodb(data: dict):
     if not isinstance(data, dict):
         raise ValueError("Input must be a dictionary")
 
-    client = pymongo.MongoClient(os.getenv("MONGO_URI"))
-
-    db = client["research_articles"]
-    collection = db["pdf_upload_papers"]
-
-    # Insert data into the collection
-    result = collection.insert_one(data)
-
-    return result.inserted_id, client
+    # The backend stores the paper; re-uploading a paper updates its existing document instead of adding a duplicate
+    response = requests.post(PAPERS_URL, json=data, timeout=REQUEST_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return response.json()["id"]
 
 
 st.title("PDF File Uploader and Processor")
@@ -150,28 +163,16 @@ if uploaded_file is not None:
     # Add upload to MongoDB button
     if st.button("Upload to MongoDB"):
         try:
-            inserted_id, client = push_data_to_mongodb(paper_data)
-            client.close()
+            inserted_id = push_data_to_mongodb(paper_data)
             st.success(f"File uploaded to MongoDB with ID: {inserted_id}")
         except Exception as e:
             st.error(f"An error occurred while uploading to MongoDB: {str(e)}")
 
-    # Generate code from paper data
-    generated_code = ""
+    # Generate code from paper data, shown as it is written
     if st.button("Generate Code"):
         try:
-            response = requests.post(
-                "https://aira-77ad510980a9.herokuapp.com/api/generate_code", json={"user_input": text}
-            )
-            if response.status_code == 200:
-                response_data = response.json()
-                generated_code = response_data.get("response")
-
-            pass
+            st.write_stream(stream_tokens(CODE_STREAM_URL, {"user_input": text}))
         except Exception as e:
             st.error(f"An error occurred while generating code: {str(e)}")
-
-    if generated_code:
-        st.markdown(generated_code)
 else:
     st.info("Please upload a PDF file.")
@@ -0,0 +1,23 @@
+"""Client side of the backend's server-sent event endpoints, shared by the Streamlit pages."""
+import json
+
+import requests
+
+
+# Yield the tokens of a server-sent event stream from the Flask API
+def stream_tokens(url, payload):
+    with requests.post(url, json=payload, stream=True) as response:
+        response.raise_for_status()
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "error":
+                    raise RuntimeError(data.get("error"))
+                if event == "done":
+                    return
+                yield data["token"]
+            elif not line:
+                event = None